@@ -1,19 +1,93 @@
-from flask import Flask, request, jsonify
+# Час старту рахується з першого рядка модуля; з preload_app (gunicorn.conf.py) модуль імпортується
+# один раз у майстрі gunicorn, а воркери отримують готовий стан через fork
+import time
+_startup_began = time.perf_counter()
+
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import os
 import re
 import logging
 from datetime import datetime
 import csv
-import io
+import codecs
+import contextvars
+import functools
+import json
+import pickle
 import traceback 
-import pdfplumber
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows: лише dev-сервер з одним процесом
+    fcntl = None
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from pdf_extract import extract_pdf_rows
+from excel_extract import iter_sheet_chunks, read_sheet, read_sheets, sheet_names
+from result_cache import ResultCache
+from jobs import JobQueue
+from catalogue import Catalogue, SEARCH_RESULT_LIMIT
+from supplier_diff import SupplierVersions, frame_with_keys
+from matching import MATCH_COLUMNS, cluster_offers, summarize_clusters
+from compact import MEMORY_SAMPLE_ROWS, compact_frame, frame_memory, wire_frame
+from columnar import (ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE, arrow_ipc_bytes, frames_to_arrow_table,
+                      parquet_bytes)
+from metrics import (StageMetrics, current_request_spans, file_size, finish_request_spans, start_request_spans,
+                     timing_breakdown)
+
+IMPORT_SECONDS = time.perf_counter() - _startup_began
 
 os.makedirs("logs", exist_ok=True)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
 app = Flask(__name__)
+# Файли у відповіді /upload лишаються в порядку завантаження, колонки — в порядку таблиці
+app.json.sort_keys = False
+
+# RESULT_CACHE_DIR — необов'язковий каталог для Parquet-копій, що переживають перезапуск воркерів.
+# RESULT_CACHE_MAX_MB обмежує фрейми в пам'яті кожного воркера; RESULT_CACHE_DISK_MAX_MB і
+# RESULT_CACHE_DISK_MAX_HOURS — Parquet-копії на диску (найдавніше використані видаляються першими)
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "32")),
+    max_bytes=float(os.environ.get("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    disk_dir=os.environ.get("RESULT_CACHE_DIR") or None,
+    max_disk_bytes=float(os.environ.get("RESULT_CACHE_DISK_MAX_MB", "2048")) * 1024 * 1024,
+    max_disk_age_hours=float(os.environ.get("RESULT_CACHE_DISK_MAX_HOURS", "168")),
+)
+
+# Тривалість, рядки, байти та пік алокацій етапів обробки — для /metrics і заголовка X-Timing.
+# Лічильники живуть у пам'яті процесу: кожен воркер gunicorn віддає власні
+stage_metrics = StageMetrics()
+
+# COMPACT_DTYPES=0 вимикає стиснення типів нормалізованих фреймів (category, Int16, float32)
+COMPACT_DTYPES = os.environ.get("COMPACT_DTYPES", "1").strip() not in ("0", "false")
+
+
+def cache_variant():
+    # Фрейми зі стисненими й повними типами — різні записи кешу (у тому числі на диску)
+    return "" if COMPACT_DTYPES else "-full"
+
+# Розмір порції рядків для потокового режиму /upload?stream=json|ndjson
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", "20000"))
+
+# Потоки для паралельної обробки файлів одного запиту /upload (власні в кожного запиту)
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Загальний бюджет одного /upload (усі файли разом) — менше за типовий timeout воркера gunicorn (30 с),
+# щоб відповідь з помилками по незавершених файлах встигла повернутись
+UPLOAD_REQUEST_TIMEOUT = float(os.environ.get("UPLOAD_REQUEST_TIMEOUT", os.environ.get("UPLOAD_FILE_TIMEOUT", "25")))
+# Подія скасування файлів поточного /upload: після вичерпання бюджету потоки, що ще працюють,
+# не пишуть у кеш і каталог і зупиняються на найближчому етапі
+_upload_cancelled = contextvars.ContextVar("upload_cancelled", default=None)
+# Файли запитів, що вже відповіли помилкою часу, але ще дорахують до найближчої перевірки скасування.
+# Поки їх стільки ж, скільки UPLOAD_WORKERS, нові /upload отримують 503, а не ділять з ними CPU і бюджет
+_abandoned_uploads = 0
+_pools_lock = threading.Lock()
+# Запис у каталог (Parquet + індекс) іде поза запитом одним фоновим потоком: черга зберігає порядок додавання/видалення
+_catalogue_pool = None
 
 column_patterns = {
     r"\bwine\b|\bproduct\b|\bdescription\b|\bnom\b": "wine_name",
@@ -28,19 +102,45 @@ column_patterns = {
     r"\b(millésime|year|vintage)\b": "year"
 }
 
+# Фонові задачі /jobs: SQLite-черга в JOBS_DIR і пул потоків у кожному воркері
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join("data", "jobs"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "600"))
+JOB_RETENTION_HOURS = float(os.environ.get("JOB_RETENTION_HOURS", "24"))
+
+# CATALOGUE_DIR — каталог постійного сховища оброблених списків для /search; порожнє значення вимикає
+CATALOGUE_DIR = os.environ.get("CATALOGUE_DIR", os.path.join("data", "catalogue"))
+catalogue = Catalogue(CATALOGUE_DIR, column_patterns.values()) if CATALOGUE_DIR else None
+
+# SUPPLIERS_DIR — останні версії прайсів постачальників для /suppliers/<назва>/delta; порожнє значення вимикає
+SUPPLIERS_DIR = os.environ.get("SUPPLIERS_DIR", os.path.join("data", "suppliers"))
+supplier_versions = SupplierVersions(SUPPLIERS_DIR) if SUPPLIERS_DIR else None
+
+# Кластери однакових вин з усіх списків каталогу для /matches. Перераховуються у фоновому потоці каталогу після
+# додавання/видалення списків і зберігаються в CATALOGUE_DIR/matches.pkl, звідки їх читають усі воркери;
+# сам /matches нічого не перераховує
+MATCHES_PAGE_SIZE = 100
+_matches_lock = threading.Lock()
+_matches = {"mtime": None, "lists": None, "clusters": None, "pending": False}
+_matches_ticket = 0
+
+# Скомпільовані шаблони в порядку пріоритету column_patterns: перший збіг визначає колонку
+COLUMN_PATTERN_REGEXES = [(re.compile(pattern), replacement) for pattern, replacement in column_patterns.items()]
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_column_name(col_name):
+    col_str = col_name.lower().strip()
+    col_str = col_str.replace('\n', ' ').replace('\r', '').replace('  ', ' ')
+    for regex, replacement in COLUMN_PATTERN_REGEXES:
+        if regex.search(col_str):
+            return replacement
+    return col_name.strip()
+
+
 def normalize_columns(columns):
-    result = []
-    for col in columns:
-        col_str = str(col).lower().strip()
-        col_str = col_str.replace('\n', ' ').replace('\r', '').replace('  ', ' ') 
-        matched = False
-        for pattern, replacement in column_patterns.items():
-            if re.search(pattern, col_str):
-                col_str = replacement
-                matched = True
-                break
-        result.append(col_str if matched else str(col).strip()) 
-    return result
+    # Постачальники повторюють ті самі макети, тож результат кешується за сирою назвою
+    return [normalize_column_name(str(col)) for col in columns]
 
 def make_columns_unique(cols):
     seen = {}
@@ -55,9 +155,25 @@ def make_columns_unique(cols):
             result.append(f"{col_name}_{seen[col_name]}")
     return result
 
+HEADER_SCAN_ROWS = 20
+HEADER_KEYWORDS = ['name', 'region', 'price', 'vintage', 'quantity', 'type', 'country',
+                   'article', 'prix', 'quantité', 'description', 'producer', 'year', 'stock', 'format']
+HEADER_KEYWORDS_RE = re.compile("|".join(re.escape(k) for k in HEADER_KEYWORDS))
+
+
+def count_header_keyword_matches(df_head):
+    # Усі клітинки вікна одним проходом Arrow-regex; нерядкові значення — не збіг
+    cells = df_head.to_numpy(dtype=object).ravel()
+    is_str = np.fromiter((isinstance(v, str) for v in cells), dtype=bool, count=len(cells))
+    matches = np.zeros(len(cells), dtype=bool)
+    if is_str.any():
+        strings = pa.array(cells[is_str], type=pa.string())
+        found = pc.match_substring_regex(pc.utf8_lower(strings), HEADER_KEYWORDS_RE.pattern)
+        matches[is_str] = found.to_numpy(zero_copy_only=False)
+    return matches.reshape(df_head.shape).sum(axis=1)
+
+
 def find_best_header_row(df_raw, filename=""):
-    header_keywords = ['name', 'region', 'price', 'vintage', 'quantity', 'type', 'country',
-                       'article', 'prix', 'quantité', 'description', 'producer', 'year', 'stock', 'format']
     best_match_count = 0
     best_header_idx = -1
 
@@ -65,17 +181,14 @@ def find_best_header_row(df_raw, filename=""):
         logging.warning(f"{filename}: df_raw is empty in find_best_header_row.")
         return 0 
 
-    for idx, row in df_raw.head(20).iterrows():
-        try:
-            match_count = sum(
-                1 for cell in row if isinstance(cell, str) and any(k in cell.lower() for k in header_keywords)
-            )
-            if match_count > best_match_count:
-                best_match_count = match_count
-                best_header_idx = idx
-        except Exception as e:
-            logging.warning(f"{filename}: Error processing row {idx} in find_best_header_row: {e}")
-            continue
+    df_head = df_raw.head(HEADER_SCAN_ROWS)
+    try:
+        match_counts = count_header_keyword_matches(df_head)
+        best_pos = int(match_counts.argmax())
+        best_match_count = int(match_counts[best_pos])
+        best_header_idx = df_head.index[best_pos]
+    except Exception as e:
+        logging.warning(f"{filename}: Error scoring header rows in find_best_header_row: {e}")
 
     if best_match_count >= 2: 
         logging.info(f"{filename}: Best header row found at index {best_header_idx} with {best_match_count} keyword matches.")
@@ -93,171 +206,811 @@ def find_best_header_row(df_raw, filename=""):
     return 0
 
 
-def try_read_csv_with_encoding(file, filename, encodings=["utf-8", "ISO-8859-1", "cp1252", "utf-16-be", "utf-16", "utf-16-le"]):
-    common_delimiters = [',', ';', '\t', '|']
-    
+CSV_ENCODINGS = ["utf-8", "ISO-8859-1", "cp1252", "utf-16-be", "utf-16", "utf-16-le"]
+CSV_SAMPLE_SIZE = 64 * 1024
+CSV_DELIMITERS = [',', ';', '\t', '|']
+CSV_BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def detect_encoding(sample_bytes, encodings, filename=""):
+    for bom, enc in CSV_BOMS:
+        if sample_bytes.startswith(bom):
+            logging.debug(f"{filename}: BOM detected, using encoding {enc}.")
+            return enc
+
+    # UTF-16 без BOM: нульові байти на парних/непарних позиціях
+    even_nulls = sample_bytes[0::2].count(0)
+    odd_nulls = sample_bytes[1::2].count(0)
+    half = max(len(sample_bytes) // 2, 1)
+    if even_nulls > half * 0.3 and even_nulls > odd_nulls * 4 and "utf-16-be" in encodings:
+        return "utf-16-be"
+    if odd_nulls > half * 0.3 and odd_nulls > even_nulls * 4 and "utf-16-le" in encodings:
+        return "utf-16-le"
+
+    best_enc, best_score = encodings[0], None
     for enc in encodings:
-        logging.info(f"{filename}: Attempting to read with encoding: {enc}")
+        if enc.startswith("utf-16"):
+            continue
         try:
-            file.seek(0)
-            sample_bytes = file.read(4096) 
-            if not sample_bytes:
-                logging.warning(f"{filename}: File is empty or unreadable (encoding {enc}).")
-                continue
-            
-            sample_content = ""
-            try:
-                sample_content = sample_bytes.decode(enc)
-            except UnicodeDecodeError:
-                logging.warning(f"{filename}: UnicodeDecodeError with {enc} on sample. Trying errors='ignore'.")
-                sample_content = sample_bytes.decode(enc, errors='ignore')
-            
-            delimiters_to_try = []
+            decoder = codecs.getincrementaldecoder(enc)(errors='replace')
+            text = decoder.decode(sample_bytes, final=False)
+        except LookupError:
+            continue
+        score = text.count('\ufffd') * 10 + sum(
+            1 for ch in text if (ord(ch) < 32 and ch not in '\t\r\n') or 0x80 <= ord(ch) < 0xa0
+        )
+        if best_score is None or score < best_score:
+            best_enc, best_score = enc, score
+        if score == 0:
+            break
+    logging.debug(f"{filename}: Detected encoding {best_enc} (score {best_score}).")
+    return best_enc
+
+
+def detect_delimiters(sample_text, filename=""):
+    lines = sample_text.splitlines()
+    if len(lines) > 1:
+        lines = lines[:-1]  # останній рядок вибірки може бути обрізаним
+    ranked = []
+    for delim in CSV_DELIMITERS:
+        try:
+            widths = [len(row) for row in csv.reader(lines, delimiter=delim, quotechar='"') if row]
+        except csv.Error:
+            continue
+        if not widths:
+            continue
+        mode_width = max(set(widths), key=widths.count)
+        consistent_rows = widths.count(mode_width) if mode_width > 1 else 0
+        ranked.append(((consistent_rows, mode_width), delim, max(widths)))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    if ranked and logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"{filename}: Delimiter candidates (consistent rows, columns): "
+                     f"{[(d, s) for s, d, _ in ranked]}")
+    return [(delim, max_width) for _, delim, max_width in ranked]
+
+
+def detect_csv_dialect(file, filename, encodings=CSV_ENCODINGS):
+    try:
+        file.seek(0)
+        sample_bytes = file.read(CSV_SAMPLE_SIZE)
+    except Exception as e:
+        logging.error(f"{filename}: Could not read CSV sample: {e}")
+        sample_bytes = b""
+    if not sample_bytes:
+        logging.warning(f"{filename}: File is empty or unreadable.")
+        return None, []
+
+    with stage_metrics.span("decode", filename, nbytes=len(sample_bytes)):
+        enc = detect_encoding(sample_bytes, encodings, filename)
+        sample_text = codecs.getincrementaldecoder(enc)(errors='replace').decode(sample_bytes, final=False)
+    with stage_metrics.span("sniff", filename, nbytes=len(sample_bytes)):
+        return enc, detect_delimiters(sample_text, filename)
+
+
+def read_csv_detected(file, enc, delim, max_width, chunksize=None):
+    # C-парсер декодує потік сам, без проміжних копій рядка.
+    # Усе читається як текст, як і раніше python-парсером: інакше C-парсер визначає типи по внутрішніх блоках
+    # і одна колонка великого файлу отримує і int, і str (а порції без рядка заголовка — інші типи, ніж перша)
+    file.seek(0)
+    return pd.read_csv(file, header=None, names=range(max_width), delimiter=delim, engine="c",
+                       encoding=enc, encoding_errors='replace', on_bad_lines='skip',
+                       skipinitialspace=True, quotechar='"', skip_blank_lines=True,
+                       chunksize=chunksize, dtype=str)
+
+
+def read_csv_reporting(file, enc, delim, max_width, progress):
+    # Для фонових задач: порціями, щоб стан задачі показував прочитані рядки ще під час розбору.
+    # Загальна кількість — оцінка за прочитаною часткою байтів
+    total_bytes = file_size(file)
+    chunks, rows = [], 0
+    for chunk in read_csv_detected(file, enc, delim, max_width, chunksize=STREAM_CHUNK_ROWS):
+        chunks.append(chunk)
+        rows += len(chunk)
+        position = file.tell()
+        progress(rows, max(int(rows * total_bytes / position) if position else rows, rows), "rows")
+    return pd.concat(chunks) if chunks else pd.DataFrame(columns=range(max_width))
+
+
+def try_read_csv_with_encoding(file, filename, encodings=CSV_ENCODINGS, progress=None):
+    enc, candidates = detect_csv_dialect(file, filename, encodings)
+    if enc is None:
+        return pd.DataFrame([{"error": f"Не вдалося прочитати CSV '{filename}': файл порожній."}])
+
+    with stage_metrics.span("parse", filename, nbytes=file_size(file)) as span:
+        for delim, max_width in candidates:
             try:
-                dialect = csv.Sniffer().sniff(sample_content)
-                detected_delimiter = dialect.delimiter
-                logging.info(f"{filename}: Sniffer detected delimiter '{detected_delimiter}' for encoding {enc}.")
-                delimiters_to_try.append(detected_delimiter)
-            except csv.Error as sniff_error:
-                logging.warning(f"{filename}: CSV Sniffer failed for encoding {enc}: {sniff_error}. Will try common delimiters.")
-            for d in common_delimiters:
-                if d not in delimiters_to_try:
-                    delimiters_to_try.append(d)
-
-            for delim in delimiters_to_try:
-                logging.info(f"{filename}: Trying delimiter '{delim}' with encoding {enc}.")
-                try:
-                    file.seek(0) 
-                    full_content_bytes = file.read()
-                    full_content_str = ""
-                    try:
-                        full_content_str = full_content_bytes.decode(enc)
-                    except UnicodeDecodeError:
-                        full_content_str = full_content_bytes.decode(enc, errors='ignore')
-
-                    buffer = io.StringIO(full_content_str)
-                    df = pd.read_csv(buffer, header=None, delimiter=delim, engine="python", on_bad_lines='skip', skipinitialspace=True, quotechar='"')
-                    
-                    # Check if DataFrame is plausible
-                    if not df.empty and df.dropna(how='all').shape[0] > 0:
-                        if df.shape[0] > 1 and df.shape[1] > 1:
-                             logging.info(f"{filename}: Successfully read CSV with encoding '{enc}' and delimiter '{delim}'. Shape: {df.shape}")
-                             return df
-                        else:
-                            logging.info(f"{filename}: Read with '{enc}','{delim}' resulted in single cell or empty data. Shape: {df.shape}. Trying next.")
-                    else:
-                        logging.info(f"{filename}: Read with '{enc}','{delim}' resulted in empty or all-NaN DataFrame. Shape: {df.shape}. Trying next.")
-                except Exception as e:
-                    logging.warning(f"{filename}: Error reading with delimiter '{delim}' and encoding {enc}: {e}")
-                    continue 
-        except Exception as e:
-            logging.warning(f"{filename}: General error with encoding {enc}: {e}")
-            continue 
-            
-    logging.error(f"{filename}: Failed to read CSV with all attempted encodings and delimiters.")
+                if progress:
+                    df = read_csv_reporting(file, enc, delim, max_width, progress)
+                else:
+                    df = read_csv_detected(file, enc, delim, max_width)
+            except Exception as e:
+                logging.debug(f"{filename}: Error reading with delimiter '{delim}' and encoding {enc}: {e}")
+                continue
+
+            df.dropna(axis=1, how='all', inplace=True)
+            if df.shape[0] > 1 and df.shape[1] > 1:
+                logging.info(f"{filename}: Successfully read CSV with encoding '{enc}' and delimiter '{delim}'. Shape: {df.shape}")
+                span["rows"] = len(df)
+                return df
+            logging.debug(f"{filename}: Read with '{enc}','{delim}' resulted in single cell or empty data. Shape: {df.shape}. Trying next.")
+
+    logging.error(f"{filename}: Failed to read CSV with detected encoding and delimiters.")
     return pd.DataFrame([{"error": f"Не вдалося прочитати CSV '{filename}' навіть з декількома кодуваннями та роздільниками."}])
 
 
-def process_file_universal(file, filename):
-    logging.info(f"--- Processing file: {filename} ---")
+def read_raw_frame(file, filename, progress=None):
     ext = os.path.splitext(filename)[1].lower()
-    df_raw = None
 
-    try:
-        if ext == ".csv":
-            df_raw = try_read_csv_with_encoding(file, filename)
-        elif ext in [".xls", ".xlsx"]:
-            file.seek(0)
-            df_raw = pd.read_excel(file, header=None)
-        elif ext == ".pdf":
+    if ext == ".csv":
+        df_raw = try_read_csv_with_encoding(file, filename, progress=progress)
+    elif ext in [".xls", ".xlsx"]:
+        with stage_metrics.span("parse", filename, nbytes=file_size(file)) as span:
+            df_raw = read_sheet(file, ext=ext, progress=progress)
+            span["rows"] = len(df_raw)
+    elif ext == ".pdf":
+        try:
+            with stage_metrics.span("parse", filename, nbytes=file_size(file)) as span:
+                all_rows = extract_pdf_rows(file, filename, progress=progress, cancelled=_upload_cancelled.get())
+                span["rows"] = len(all_rows or [])
+            if not all_rows or len(all_rows) < 2:
+                return [{"error": f"{filename}: не вдалося знайти таблицю у PDF."}]
+            df_raw = pd.DataFrame(all_rows)
+        except CancelledError:
+            raise UploadCancelled(filename)
+        except Exception as e:
+            return [{"error": f"{filename}: помилка при зчитуванні PDF — {str(e)}"}]
+    else:
+        return [{"error": f"{filename}: Unsupported file type '{ext}'"}]
+
+    if isinstance(df_raw, pd.DataFrame) and "error" in df_raw.columns and df_raw.shape[0] == 1:
+        logging.error(f"{filename}: try_read_csv_with_encoding returned an error: {df_raw.iloc[0]['error']}")
+        return df_raw.to_dict(orient='records')
+
+    if df_raw is None or df_raw.empty:
+        logging.error(f"{filename}: File is empty or could not be read into DataFrame.")
+        return [{"error": f"{filename}: файл порожній або не вдалося прочитати"}]
+
+    return df_raw
+
+
+def apply_header(df_raw, header_idx):
+    raw_header_series = df_raw.loc[header_idx]
+    raw_header = [str(c).strip() for c in raw_header_series.fillna('').astype(str)]
+    df = df_raw.loc[df_raw.index > header_idx].copy()
+    df.columns = raw_header
+    return df
+
+
+NUMERIC_CELL_RE = re.compile(r'^\s*[\d,.]+\s*$')
+PRICE_COLUMN_RE = re.compile(r'price(_\d+)?|regular|ht|ttc|\£|\€|\$')
+NON_NUMERIC_CHARS_RE = re.compile(r'[^\d.-]')
+
+
+def coerce_numeric(series):
+    if pd.api.types.is_numeric_dtype(series):
+        # Nullable Int16/Int32 після compact_frame: pd.NA у масиві numpy не порівнюється, тож переводимо у float з NaN
+        return series.astype(float) if pd.api.types.is_extension_array_dtype(series) else series
+    # Кожне унікальне значення розбираємо один раз: роки, залишки й ціни в прайсах сильно повторюються
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce')
+    # Regex-очищення лише для значень на кшталт "CHF 12.50", які не розібралися напряму.
+    # Після вилучення символів лишаються '', '.' або '-', які to_numeric і так перетворює на NaN
+    failed = parsed.isna().to_numpy()
+    if failed.any():
+        cleaned = pd.Series(uniques[failed], dtype=object).astype(str).str.replace(NON_NUMERIC_CHARS_RE, '', regex=True)
+        parsed = parsed.astype(float)
+        parsed[failed] = pd.to_numeric(cleaned, errors='coerce').to_numpy()
+    values = parsed.to_numpy()
+    if (codes < 0).any():
+        values = np.append(values.astype(float), np.nan)
+    return pd.Series(values[codes], index=series.index, name=series.name)
+
+
+def clean_numeric_columns(df, filename):
+    # Кома в числах → крапка
+    for col in df.select_dtypes(include=['object']):
+        try:
+            values = df[col]
+            # Дорожчий regex-прохід лише для колонок, де взагалі є кома
+            if values.str.contains(',', regex=False, na=False).any() and values.str.match(NUMERIC_CELL_RE, na=False).any():
+                df[col] = values.str.replace(',', '.', regex=False)
+        except AttributeError:
+            continue  # у колонці немає рядків
+        except Exception as e:
+            logging.warning(f"{filename}: Error during comma→dot conversion ({col}): {e}")
+
+    # Привести до чисел колонки з цінами
+    for col_name in df.columns:
+        if PRICE_COLUMN_RE.search(str(col_name).lower()):
             try:
-                file.seek(0)
-                with pdfplumber.open(file) as pdf:
-                    all_rows = []
-                    for page in pdf.pages:
-                        table = page.extract_table()
-                        if table:
-                            all_rows.extend(table)
-                if not all_rows or len(all_rows) < 2:
-                    return [{"error": f"{filename}: не вдалося знайти таблицю у PDF."}]
-                df_raw = pd.DataFrame(all_rows)
+                series = df[col_name]
+                if series.ndim == 1 and not pd.api.types.is_numeric_dtype(series):
+                    df[col_name] = coerce_numeric(series)
             except Exception as e:
-                return [{"error": f"{filename}: помилка при зчитуванні PDF — {str(e)}"}]
-        else:
-            return [{"error": f"{filename}: Unsupported file type '{ext}'"}]
+                logging.error(f"{filename}: Price column error ({col_name}): {e}")
+    return df
+
 
-        if isinstance(df_raw, pd.DataFrame) and "error" in df_raw.columns and df_raw.shape[0] == 1:
-            logging.error(f"{filename}: try_read_csv_with_encoding returned an error: {df_raw.iloc[0]['error']}")
-            return df_raw.to_dict(orient='records')
+def build_normalized_frame(file, filename, progress=None):
+    df_raw = read_raw_frame(file, filename, progress)
+    if isinstance(df_raw, list):
+        return df_raw
+    if progress:
+        progress(len(df_raw), len(df_raw), "rows")
+    check_cancelled(filename)
+    return normalize_raw_frame(df_raw, filename)
 
-        if df_raw is None or df_raw.empty:
-            logging.error(f"{filename}: File is empty or could not be read into DataFrame.")
-            return [{"error": f"{filename}: файл порожній або не вдалося прочитати"}]
 
-        logging.info(f"{filename}: Initial raw DataFrame shape: {df_raw.shape}")
+def normalize_raw_frame(df_raw, filename):
+    if df_raw.empty:
+        logging.error(f"{filename}: File is empty or could not be read into DataFrame.")
+        return [{"error": f"{filename}: файл порожній або не вдалося прочитати"}]
+
+    logging.info(f"{filename}: Initial raw DataFrame shape: {df_raw.shape}")
 
+    with stage_metrics.span("header", filename, rows=len(df_raw)):
         header_idx = find_best_header_row(df_raw, filename)
         if header_idx >= len(df_raw):
             logging.error(f"{filename}: Calculated header_idx {header_idx} is out of bounds.")
             return [{"error": f"{filename}: індекс заголовка ({header_idx}) виходить за межі таблиці"}]
 
-        raw_header_series = df_raw.iloc[header_idx]
-        raw_header = [str(c).strip() for c in raw_header_series.fillna('').astype(str)]
-        df = df_raw.iloc[header_idx + 1:].copy()
-        df.columns = raw_header
-        df.reset_index(drop=True, inplace=True)
+        df = apply_header(df_raw, header_idx)
+    del df_raw
 
+    with stage_metrics.span("normalize", filename, rows=len(df)):
+        df.reset_index(drop=True, inplace=True)
         df.dropna(axis=1, how='all', inplace=True)
         df.columns = normalize_columns(df.columns)
         df.columns = make_columns_unique(df.columns)
         df.dropna(axis=0, how='all', inplace=True)
 
-        if df.empty:
-            logging.error(f"{filename}: DataFrame is empty after processing.")
-            return [{"error": f"{filename}: таблиця порожня після обробки"}]
+    if df.empty:
+        logging.error(f"{filename}: DataFrame is empty after processing.")
+        return [{"error": f"{filename}: таблиця порожня після обробки"}]
+
+    with stage_metrics.span("price", filename, rows=len(df)):
+        df = clean_numeric_columns(df, filename)
+
+    if not COMPACT_DTYPES:
+        return df
+    with stage_metrics.span("compact", filename, rows=len(df)):
+        return compact_normalized_frame(df, filename)
+
+
+def compact_normalized_frame(df, filename):
+    before = frame_memory(df, MEMORY_SAMPLE_ROWS)
+    df, changes = compact_frame(df)
+    after = frame_memory(df, MEMORY_SAMPLE_ROWS)
+    logging.info(f"{filename}: Compact dtypes {changes or '(none)'}, memory {before / 2**20:.1f} MB → {after / 2**20:.1f} MB.")
+    return df
+
+
+class FileReadError(Exception):
+    pass
+
+
+class UploadCancelled(Exception):
+    pass
+
+
+def check_cancelled(filename):
+    cancelled = _upload_cancelled.get()
+    if cancelled is not None and cancelled.is_set():
+        raise UploadCancelled(filename)
+
+
+def iter_raw_chunks(file, filename, chunksize):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv":
+        enc, candidates = detect_csv_dialect(file, filename)
+        if not candidates:
+            raise FileReadError(f"Не вдалося прочитати CSV '{filename}': файл порожній.")
+        delim, max_width = candidates[0]
+        with read_csv_detected(file, enc, delim, max_width, chunksize=chunksize) as reader:
+            yield from reader
+    elif ext == ".xlsx":
+        yield from iter_sheet_chunks(file, chunksize)
+    else:
+        # .xls та PDF не читаються потоково — обробляємо цілим фреймом
+        df_raw = read_raw_frame(file, filename)
+        if isinstance(df_raw, list):
+            raise FileReadError(df_raw[0]["error"])
+        yield df_raw
+
+
+def iter_normalized_chunks(file, filename, chunksize=None):
+    chunksize = chunksize or STREAM_CHUNK_ROWS
+    chunks = iter_raw_chunks(file, filename, chunksize)
+    first = next(chunks, None)
+    if first is None or first.empty:
+        raise FileReadError(f"{filename}: файл порожній або не вдалося прочитати")
+
+    # Заголовок шукаємо лише в перших HEADER_SCAN_ROWS рядках
+    header_idx = find_best_header_row(first.head(HEADER_SCAN_ROWS), filename)
+    width = first.shape[1]
+    head = apply_header(first, header_idx)
+    # Без повного файлу порожні колонки відкидаємо лише якщо в них немає і назви
+    keep = [i for i, name in enumerate(head.columns) if name or head.iloc[:, i].notna().any()]
+    columns = make_columns_unique(normalize_columns([head.columns[i] for i in keep]))
+
+    def normalize_chunk(chunk):
+        chunk = chunk.iloc[:, keep]
+        chunk.columns = columns
+        chunk = chunk.dropna(axis=0, how='all')
+        return clean_numeric_columns(chunk, filename)
+
+    rows = len(head)
+    yield normalize_chunk(head)
+    for chunk in chunks:
+        if chunk.shape[1] != width:
+            chunk = chunk.reindex(columns=range(width))
+        rows += len(chunk)
+        yield normalize_chunk(chunk)
+    logging.info(f"{filename}: Streamed {rows} rows in chunks of {chunksize}.")
+
+
+def convert_to_json_safe(val):
+    return None if pd.isna(val) else val
+
+
+def records_json_safe(df):
+    df = wire_frame(df)
+    return [{k: convert_to_json_safe(v) for k, v in row.items()} for row in df.to_dict(orient='records')]
+
+
+# Колонки, для яких ?колонка=число — рівність після приведення до числа, а не пошук підрядка
+NUMERIC_QUERY_COLUMNS = {"price", "year", "stock"}
+
+
+def parse_number(value):
+    return float(value.strip().replace(",", "."))
+
+
+def parse_query(args):
+    # Розбір ?колонка=значення, ?колонка_min/_max=число, ?in_stock=1, ?sort=-price,year, ?fields=, ?limit=, ?offset=
+    allowed_filters = set(column_patterns.values())
+    query = {"text": [], "equals": [], "ranges": [], "in_stock": False,
+             "sort": [], "fields": None, "limit": None, "offset": 0}
+    for param in args:
+        value = args.get(param, "").strip()
+        if not value:
+            continue
+        column, _, bound = param.rpartition("_")
+        if param in allowed_filters:
+            try:
+                if param not in NUMERIC_QUERY_COLUMNS:
+                    raise ValueError
+                query["equals"].append((param, parse_number(value)))
+            except ValueError:
+                query["text"].append((param, value))
+        elif column in allowed_filters and bound in ("min", "max"):
+            try:
+                number = parse_number(value)
+            except ValueError:
+                raise ValueError(f"Параметр {param} має бути числом.")
+            query["ranges"].append((column, ">=" if bound == "min" else "<=", number))
+        elif param == "in_stock":
+            query["in_stock"] = value.lower() in ("1", "true", "yes")
+        elif param in ("limit", "offset"):
+            if not value.isdigit():
+                raise ValueError(f"Параметр {param} має бути невід'ємним цілим числом.")
+            query[param] = int(value)
+        elif param == "sort":
+            query["sort"] = [(name.strip().lstrip("-"), not name.strip().startswith("-"))
+                             for name in value.split(",") if name.strip().lstrip("-")]
+        elif param == "fields":
+            query["fields"] = [name.strip() for name in value.split(",") if name.strip()]
+    return query
+
+
+def query_mask(df, query):
+    # Усі предикати — одна булева маска; колонки, яких немає у файлі, пропускаються. None — без фільтрів
+    conditions = []
+    numeric = {}
+
+    def numeric_values(col):
+        if col not in numeric:
+            numeric[col] = coerce_numeric(df[col]).to_numpy()
+        return numeric[col]
+
+    for col, value in query["text"]:
+        if col in df.columns:
+            conditions.append(text_contains(df[col], value))
+    for col, number in query["equals"]:
+        if col in df.columns:
+            conditions.append(numeric_values(col) == number)
+    for col, op, number in query["ranges"]:
+        if col in df.columns:
+            conditions.append(numeric_values(col) >= number if op == ">=" else numeric_values(col) <= number)
+    if query["in_stock"] and "stock" in df.columns:
+        conditions.append(numeric_values("stock") > 0)
+
+    if not conditions:
+        return None
+    return np.logical_and.reduce(conditions)
+
+
+def text_contains(series, value):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Для category перевіряємо лише унікальні значення і розкладаємо по кодах рядків (-1 — порожня клітинка)
+        found = np.asarray(series.cat.categories.astype(str).str.contains(value, case=False, regex=False), dtype=bool)
+        return np.append(found, False)[series.cat.codes.to_numpy()]
+    return series.astype(str).str.contains(value, case=False, regex=False, na=False).to_numpy()
+
+
+def sort_key(series):
+    if series.name in NUMERIC_QUERY_COLUMNS or pd.api.types.is_numeric_dtype(series):
+        return coerce_numeric(series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    return series.where(series.isna(), series.astype(str).str.lower())
+
+
+def sorted_positions(df, rows, sort):
+    sort = [(col, ascending) for col, ascending in sort if col in df.columns]
+    if not sort:
+        return rows
+    # Сортуємо лише ключові колонки відібраних рядків і переставляємо позиції
+    keys = df.iloc[rows, [df.columns.get_loc(col) for col, _ in sort]].reset_index(drop=True)
+    order = keys.sort_values([col for col, _ in sort], ascending=[asc for _, asc in sort], key=sort_key,
+                             kind="stable", na_position="last").index.to_numpy()
+    return rows[order]
+
+
+def projected_positions(df, fields):
+    if fields is None:
+        return slice(None)
+    return [df.columns.get_loc(col) for col in fields if col in df.columns]
+
+
+def apply_query_filters(df, args):
+    query = parse_query(args)
+    mask = query_mask(df, query)
+    if mask is None and not query["sort"] and query["fields"] is None and query["limit"] is None and not query["offset"]:
+        return df
+
+    # Один iloc по позиціях рядків і колонок замість послідовних зрізів фрейму
+    rows = np.arange(len(df)) if mask is None else np.flatnonzero(mask)
+    rows = sorted_positions(df, rows, query["sort"])
+    stop = None if query["limit"] is None else query["offset"] + query["limit"]
+    rows = rows[query["offset"]:stop]
+    return df.iloc[rows, projected_positions(df, query["fields"])]
+
+
+def query_error(args, streaming=False):
+    try:
+        query = parse_query(args)
+    except ValueError as e:
+        return str(e)
+    if streaming and query["sort"]:
+        return "Параметр sort не підтримується в потоковому режимі."
+    return None
+
 
-        # Кома в числах → крапка
+def wants_all_sheets(args, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in (".xls", ".xlsx") and args.get("sheets", "").strip().lower() == "all"
+
+
+def _get_catalogue_pool():
+    global _catalogue_pool
+    with _pools_lock:
+        if _catalogue_pool is None:
+            _catalogue_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalogue")
+        return _catalogue_pool
+
+
+def submit_catalogue_update(label, rows, func, *args):
+    # Список з'являється в /search і /matches за мить після відповіді на завантаження
+    cancelled = _upload_cancelled.get()
+
+    def run():
+        if cancelled is not None and cancelled.is_set():
+            logging.warning(f"{label}: Upload time budget exhausted, not added to catalogue.")
+            return
         try:
-            for col in df.select_dtypes(include=['object']):
-                if df[col].str.contains(',', na=False).any() and df[col].str.match(r'^\s*[\d,.]+\s*$', na=False).any():
-                    df[col] = df[col].str.replace(',', '.', regex=False)
+            with stage_metrics.span("catalogue", label, rows=rows):
+                func(*args)
         except Exception as e:
-            logging.warning(f"{filename}: Error during comma→dot conversion: {e}")
+            logging.error(f"{label}: Could not update catalogue: {e}")
+        schedule_matches_refresh()
+    # У запиті запис стартує після відправки відповіді (submit_deferred_catalogue_updates), щоб не ділити з нею CPU
+    if has_request_context():
+        request.environ.setdefault("catalogue.updates", []).append(run)
+    else:
+        _get_catalogue_pool().submit(run)
 
-        # Привести до чисел колонки з цінами
-        for col_name in df.columns:
-            if re.search(r'price(_\d+)?|regular|ht|ttc|\£|\€|\$', str(col_name).lower()):
-                try:
-                    series = df[col_name]
-                    if series.ndim == 1:
-                        cleaned_series = series.astype(str).str.replace(r'[^\d.-]', '', regex=True)
-                        cleaned_series = cleaned_series.replace(r'^\.$|^\-$|^\s*$', pd.NA, regex=True)
-                        df[col_name] = pd.to_numeric(cleaned_series, errors='coerce')
-                except Exception as e:
-                    logging.error(f"{filename}: Price column error ({col_name}): {e}")
-
-        # Фільтрація по query-параметрам
-        def convert_to_json_safe(val):
-            return None if pd.isna(val) else val
-
-        allowed_filters = set(column_patterns.values())
-        for param in request.args:
-            if param in df.columns and param in allowed_filters:
-                value = request.args.get(param).strip().lower()
-                if value:
-                    df = df[df[param].astype(str).str.lower().str.contains(value, na=False)]
-
-        data = df.to_dict(orient='records')
-        safe_data = [{k: convert_to_json_safe(v) for k, v in row.items()} for row in data]
-        logging.info(f"{filename}: Successfully processed. Returning {len(safe_data)} records.")
-        return safe_data
 
+def finish_frame(df, cache_key, label, args, content=None):
+    check_cancelled(label)
+    if catalogue is not None:
+        content = content or result_cache.content_id(cache_key)
+        # ?supplier= зводить файли з різними іменами (cave_copy.csv, Cave.xlsx) до одного постачальника в /matches
+        supplier = args.get("supplier", "").strip()
+        submit_catalogue_update(label, len(df), catalogue.add_list, cache_key, label, df, content, supplier)
+
+    # Фільтрація по query-параметрам
+    with stage_metrics.span("filter", label, rows=len(df)) as span:
+        df = apply_query_filters(df, args)
+        span["rows"] = len(df)
+    return df
+
+
+def load_workbook_frames(file, filename, args, progress=None):
+    # ?sheets=all: кожен аркуш — окремий результат із ключем "файл#аркуш"
+    ext = os.path.splitext(filename)[1].lower()
+    file_key = result_cache.make_key(file, ext, cache_variant())
+    sheets = sheet_names(file, ext)
+    results, missing = {}, []
+    for sheet_name in sheets:
+        df = result_cache.get(result_cache.derive_key(file_key, sheet_name))
+        if df is None:
+            missing.append(sheet_name)
+        else:
+            results[sheet_name] = df
+
+    try:
+        raw_frames = read_sheets(file, filename, missing, ext, cancelled=_upload_cancelled.get()) if missing else {}
+    except CancelledError:
+        raise UploadCancelled(filename)
+    output = {}
+    for done, sheet_name in enumerate(sheets):
+        if progress:
+            progress(done, len(sheets), "sheets")
+        label = f"{filename}#{sheet_name}"
+        cache_key = result_cache.derive_key(file_key, sheet_name)
+        df = results.get(sheet_name)
+        if df is None:
+            raw = raw_frames[sheet_name]
+            if isinstance(raw, Exception):
+                output[label] = [{"error": f"{label}: помилка при зчитуванні аркуша — {raw}"}]
+                continue
+            check_cancelled(label)
+            df = normalize_raw_frame(raw, label)
+            if isinstance(df, list):
+                output[label] = df
+                continue
+            check_cancelled(label)
+            result_cache.put(cache_key, df)
+        content = f"{result_cache.content_id(file_key)}#{sheet_name}"
+        output[label] = finish_frame(df, cache_key, label, args, content)
+    if progress:
+        progress(len(sheets), len(sheets), "sheets")
+    return output
+
+
+def load_normalized_frame(file, filename, progress=None):
+    cache_key = result_cache.make_key(file, os.path.splitext(filename)[1], cache_variant())
+    df = result_cache.get(cache_key)
+    if df is None:
+        df = build_normalized_frame(file, filename, progress)
+        if not isinstance(df, list):
+            check_cancelled(filename)
+            result_cache.put(cache_key, df)
+    else:
+        logging.info(f"{filename}: Result cache hit ({cache_key}), skipping parsing.")
+    return cache_key, df
+
+
+def load_filtered_frame(file, filename, args=None, progress=None):
+    args = request.args if args is None else args
+    with stage_metrics.span("total", filename, nbytes=file_size(file)) as span:
+        result = load_filtered_frame_untimed(file, filename, args, progress)
+        if isinstance(result, pd.DataFrame):
+            span["rows"] = len(result)
+        return result
+
+
+def load_filtered_frame_untimed(file, filename, args, progress=None):
+    logging.info(f"--- Processing file: {filename} ---")
+
+    try:
+        if wants_all_sheets(args, filename):
+            return load_workbook_frames(file, filename, args, progress)
+
+        cache_key, df = load_normalized_frame(file, filename, progress)
+        if isinstance(df, list):
+            return df
+        return finish_frame(df, cache_key, filename, args)
+
+    except UploadCancelled:
+        logging.warning(f"{filename}: Upload time budget exhausted, processing stopped without saving results.")
+        return [{"error": f"{filename}: перевищено час обробки ({UPLOAD_REQUEST_TIMEOUT:g} с)"}]
     except Exception as e:
         tb_str = traceback.format_exc()
         logging.error(f"\n--- Critical Error: {datetime.now()} ---\nFile: {filename}\nError: {str(e)}\nTraceback:\n{tb_str}")
         return [{"error": f"{filename}: КРИТИЧНА ПОМИЛКА ОБРОБКИ - {str(e)}"}]
 
 
+def frame_to_records(df, filename):
+    if isinstance(df, list):
+        return df
+    try:
+        with stage_metrics.span("serialize", filename, rows=len(df)):
+            safe_data = records_json_safe(df)
+    except Exception as e:
+        logging.error(f"{filename}: Could not serialize records: {e}")
+        return [{"error": f"{filename}: КРИТИЧНА ПОМИЛКА ОБРОБКИ - {str(e)}"}]
+    logging.info(f"{filename}: Successfully processed. Returning {len(safe_data)} records.")
+    return safe_data
+
+
+def process_file_universal(file, filename, args=None):
+    df = load_filtered_frame(file, filename, args)
+    # Відповідь уже віддана з помилкою — перетворювати рядки в JSON нема для кого
+    check_cancelled(filename)
+    if isinstance(df, dict):
+        return {label: frame_to_records(sheet_df, label) for label, sheet_df in df.items()}
+    return frame_to_records(df, filename)
+
+
+def stream_file_records(file, filename):
+    query = parse_query(request.args)
+    skip, remaining = query["offset"], query["limit"]
+    try:
+        for chunk in iter_normalized_chunks(file, filename):
+            mask = query_mask(chunk, query)
+            rows = np.arange(len(chunk)) if mask is None else np.flatnonzero(mask)
+            skipped = min(skip, len(rows))
+            rows, skip = rows[skipped:], skip - skipped
+            if remaining is not None:
+                rows = rows[:remaining]
+                remaining -= len(rows)
+            if len(rows):
+                yield records_json_safe(chunk.iloc[rows, projected_positions(chunk, query["fields"])])
+            if remaining == 0:
+                # Сторінку набрано — решту файлу не читаємо
+                break
+    except FileReadError as e:
+        logging.error(f"{filename}: {e}")
+        yield [{"error": str(e)}]
+    except Exception as e:
+        tb_str = traceback.format_exc()
+        logging.error(f"\n--- Critical Error: {datetime.now()} ---\nFile: {filename}\nError: {str(e)}\nTraceback:\n{tb_str}")
+        yield [{"error": f"{filename}: КРИТИЧНА ПОМИЛКА ОБРОБКИ - {str(e)}"}]
+
+
+def stream_upload_response(uploaded_files, fmt):
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, default=str)
+
+    def generate_ndjson():
+        for file_storage in uploaded_files:
+            filename = file_storage.filename
+            for records in stream_file_records(file_storage, filename):
+                yield "".join(dumps({"file": filename, "row": row}) + "\n" for row in records)
+
+    def generate_json():
+        # Та сама структура, що й у звичайній відповіді /upload: {файл: [рядки]}
+        yield "{"
+        for i, file_storage in enumerate(uploaded_files):
+            filename = file_storage.filename
+            yield ("," if i else "") + dumps(filename) + ":["
+            first = True
+            for records in stream_file_records(file_storage, filename):
+                yield ("" if first else ",") + ",".join(dumps(row) for row in records)
+                first = False
+            yield "]"
+        yield "}"
+
+    if fmt == "ndjson":
+        return Response(stream_with_context(generate_ndjson()), mimetype="application/x-ndjson")
+    return Response(stream_with_context(generate_json()), mimetype="application/json")
+
+
+def _track_abandoned_upload(future):
+    global _abandoned_uploads
+    with _pools_lock:
+        _abandoned_uploads += 1
+
+    def release(_):
+        global _abandoned_uploads
+        with _pools_lock:
+            _abandoned_uploads -= 1
+    future.add_done_callback(release)
+
+
+def uploads_busy():
+    with _pools_lock:
+        return _abandoned_uploads >= max(1, UPLOAD_WORKERS)
+
+
+def add_file_result(result, filename, file_result):
+    # Книга з ?sheets=all повертає словник результатів по аркушах
+    if isinstance(file_result, dict):
+        result.update(file_result)
+    else:
+        result[filename] = file_result
+
+
+def process_files_concurrently(file_storages, args, worker=process_file_universal):
+    # Потоки: pandas/pyarrow відпускають GIL, а сторінки PDF і так розбирає пул процесів з pdf_extract.
+    # Навіть один файл іде через пул, щоб запит чекав його не довше за UPLOAD_REQUEST_TIMEOUT.
+    # Пул у кожного запиту свій: його файли не стоять у черзі за недорахованими файлами попереднього запиту
+    pool = ThreadPoolExecutor(max_workers=max(1, min(UPLOAD_WORKERS, len(file_storages))), thread_name_prefix="upload")
+    cancelled = threading.Event()
+    futures = []
+    for f in file_storages:
+        # Копія контексту передає у потік збирач спанів поточного запиту (X-Timing) і подію скасування
+        context = contextvars.copy_context()
+        context.run(_upload_cancelled.set, cancelled)
+        futures.append((f.filename, pool.submit(context.run, worker, f, f.filename, args)))
+
+    deadline = time.monotonic() + UPLOAD_REQUEST_TIMEOUT
+    result = {}
+    for filename, future in futures:
+        try:
+            add_file_result(result, filename, future.result(timeout=max(0, deadline - time.monotonic())))
+        except FuturesTimeoutError:
+            # Файли, що ще в черзі, скасовуються; ті, що вже обробляються, зупиняться на найближчій перевірці
+            cancelled.set()
+            if not future.cancel():
+                _track_abandoned_upload(future)
+            logging.error(f"{filename}: Upload exceeded {UPLOAD_REQUEST_TIMEOUT:g}s budget, file skipped.")
+            result[filename] = [{"error": f"{filename}: перевищено час обробки ({UPLOAD_REQUEST_TIMEOUT:g} с)"}]
+    pool.shutdown(wait=False, cancel_futures=True)
+    return result
+
+
+def negotiate_response_format():
+    requested = request.args.get("format", "").strip().lower()
+    if requested in ("json", "ndjson", "arrow", "parquet"):
+        return requested
+    best = request.accept_mimetypes.best_match(["application/json", ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE])
+    return {ARROW_STREAM_MIMETYPE: "arrow", PARQUET_MIMETYPE: "parquet"}.get(best, "json")
+
+
+def columnar_upload_response(file_storages, response_format):
+    results = process_files_concurrently(file_storages, request.args, worker=load_filtered_frame)
+    frames = {name: df for name, df in results.items() if isinstance(df, pd.DataFrame)}
+    errors = {name: res[0].get("error", "") for name, res in results.items() if not isinstance(res, pd.DataFrame)}
+    return columnar_response(frames, errors, response_format)
+
+
+def columnar_response(frames, errors, response_format):
+    with stage_metrics.span("serialize", rows=sum(len(df) for df in frames.values())):
+        table = frames_to_arrow_table(frames, errors)
+        if response_format == "parquet":
+            return Response(parquet_bytes(table), mimetype=PARQUET_MIMETYPE)
+        return Response(arrow_ipc_bytes(table), mimetype=ARROW_STREAM_MIMETYPE)
+
+
+def wants_timing():
+    return request.args.get("timing", "").strip().lower() in ("1", "true") or request.headers.get("X-Timing") == "1"
+
+
+@app.before_request
+def start_timing():
+    if wants_timing():
+        g.timing_token = start_request_spans()
+
+
+@app.after_request
+def add_timing_header(response):
+    # Потокова відповідь уже віддає заголовки до обробки файлів — розбивку додати неможливо
+    if "timing_token" in g and not response.is_streamed:
+        response.headers["X-Timing"] = json.dumps(timing_breakdown(current_request_spans()), ensure_ascii=True)
+    return response
+
+
+@app.after_request
+def submit_deferred_catalogue_updates(response):
+    # Список читається при закритті відповіді, тобто вже після того, як клієнт її отримав
+    updates = request.environ.setdefault("catalogue.updates", [])
+    response.call_on_close(lambda: [_get_catalogue_pool().submit(run) for run in updates])
+    return response
+
+
+@app.teardown_request
+def stop_timing(exc=None):
+    token = g.pop("timing_token", None)
+    if token is not None:
+        finish_request_spans(token)
+
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
@@ -268,16 +1021,309 @@ def upload_files():
     if not uploaded_files or not uploaded_files[0].filename :
         return jsonify({'error': 'Список файлів порожній або файл без імені.'}), 400
         
-    result = {}
+    named_files = []
     for file_storage in uploaded_files:
         if file_storage and file_storage.filename:
-            filename = file_storage.filename
-            result[filename] = process_file_universal(file_storage, filename)
+            named_files.append(file_storage)
         else:
             logging.warning("Received an empty file or file without a name in the list.")
 
+    if uploads_busy():
+        return jsonify({'error': 'Сервер ще завершує файли попередніх запитів, що перевищили час обробки. '
+                                 'Спробуйте за хвилину.'}), 503, {'Retry-After': '30'}
+
+    response_format = negotiate_response_format()
+    stream_mode = request.args.get("stream", "").strip().lower()
+    streaming = response_format == "ndjson" or stream_mode in ("1", "true", "json", "ndjson")
+    error = query_error(request.args, streaming)
+    if error:
+        return jsonify({'error': error}), 400
+
+    if streaming:
+        return stream_upload_response(named_files, "ndjson" if "ndjson" in (stream_mode, response_format) else "json")
+
+    if response_format in ("arrow", "parquet"):
+        return columnar_upload_response(named_files, response_format)
+
+    return jsonify(process_files_concurrently(named_files, request.args))
+
+job_queue = JobQueue(
+    JOBS_DIR, run_file=load_filtered_frame, workers=JOB_WORKERS,
+    stale_seconds=JOB_STALE_SECONDS, retention_hours=JOB_RETENTION_HOURS,
+)
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    if 'files' not in request.files:
+        return jsonify({'error': 'Файли не надіслані'}), 400
+
+    named_files = [f for f in request.files.getlist('files') if f and f.filename]
+    if not named_files:
+        return jsonify({'error': 'Список файлів порожній або файл без імені.'}), 400
+
+    error = query_error(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    job_id = job_queue.submit(named_files, request.args)
+    return jsonify({'id': job_id, 'status_url': f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': f"Задачу {job_id} не знайдено"}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': f"Задачу {job_id} не знайдено"}), 404
+    if status['status'] not in ('done', 'failed'):
+        return jsonify({'error': 'Задача ще виконується', 'status': status}), 409
+
+    results = job_queue.result_frames(job_id)
+    frames = {label: res for label, res in results.items() if isinstance(res, pd.DataFrame)}
+    errors = {label: res for label, res in results.items() if not isinstance(res, pd.DataFrame)}
+    response_format = negotiate_response_format()
+    if response_format in ("arrow", "parquet"):
+        return columnar_response(frames, errors, response_format)
+    return jsonify({label: records_json_safe(res) if isinstance(res, pd.DataFrame) else [{"error": res}]
+                    for label, res in results.items()})
+
+@app.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    if job_queue.status(job_id) is None:
+        return jsonify({'error': f"Задачу {job_id} не знайдено"}), 404
+    return jsonify({'id': job_id, 'requeued': job_queue.retry(job_id)})
+
+def supplier_list_id(supplier, cache_key):
+    # Окремий ідентифікатор у каталозі: той самий файл, завантажений через /upload, не зачіпається
+    return result_cache.derive_key(cache_key, f"supplier:{supplier}")
+
+
+@app.route('/suppliers/<supplier>/delta', methods=['POST'])
+def supplier_delta(supplier):
+    if supplier_versions is None:
+        return jsonify({'error': 'Версії прайсів вимкнено (SUPPLIERS_DIR не задано).'}), 503
+
+    named_files = [f for f in request.files.getlist('files') if f and f.filename]
+    if len(named_files) != 1:
+        return jsonify({'error': 'Надішліть рівно один файл прайсу постачальника.'}), 400
+    since = request.args.get('since', '').strip()
+    if since and not since.isdigit():
+        return jsonify({'error': 'Параметр since має бути номером версії.'}), 400
+    file_storage = named_files[0]
+    filename = file_storage.filename
+
+    try:
+        with stage_metrics.span("total", filename, nbytes=file_size(file_storage)):
+            cache_key, df = load_normalized_frame(file_storage, filename)
+        if isinstance(df, list):
+            return jsonify({'error': df[0]['error']}), 422
+        with stage_metrics.span("diff", filename, rows=len(df)):
+            delta, meta, previous_key = supplier_versions.update(supplier, filename, cache_key, df)
+    except Exception as e:
+        tb_str = traceback.format_exc()
+        logging.error(f"\n--- Critical Error: {datetime.now()} ---\nFile: {filename}\nError: {str(e)}\nTraceback:\n{tb_str}")
+        return jsonify({'error': f"{filename}: КРИТИЧНА ПОМИЛКА ОБРОБКИ - {str(e)}"}), 500
+
+    unchanged = previous_key == cache_key
+    if catalogue is not None and not unchanged:
+        # Каталог тримає лише останню версію прайсу постачальника
+        def replace_supplier_list(df, cache_key, previous_key):
+            content = f"{result_cache.content_id(cache_key)}#supplier:{supplier}"
+            catalogue.add_list(supplier_list_id(supplier, cache_key), supplier, df, content, supplier)
+            if previous_key:
+                catalogue.remove_list(supplier_list_id(supplier, previous_key))
+        submit_catalogue_update(supplier, len(df), replace_supplier_list, df, cache_key, previous_key)
+
+    counts = {kind: len(frame) for kind, frame in delta.items()}
+    logging.info(f"{supplier}: version {meta['version']} from {filename}, delta {counts}.")
+    # Дельта застосовна лише до версії, яку має клієнт (?since=); інакше віддаємо весь список як added
+    base_version = meta['version'] if unchanged else meta['version'] - 1
+    reset = since != str(base_version) and not (base_version == 0 and not since)
+    if reset:
+        empty = delta['removed'].iloc[0:0]
+        delta = {'added': frame_with_keys(df), 'changed': empty, 'removed': empty}
+    with stage_metrics.span("serialize", filename, rows=sum(len(frame) for frame in delta.values())):
+        return jsonify({
+            'supplier': supplier, 'version': meta['version'], 'rows': meta['rows'], 'unchanged': unchanged,
+            'reset': reset, 'counts': counts, **{kind: records_json_safe(frame) for kind, frame in delta.items()},
+        })
+
+@app.route('/suppliers/<supplier>', methods=['GET'])
+def supplier_status(supplier):
+    meta = supplier_versions.meta(supplier) if supplier_versions is not None else None
+    if meta is None:
+        return jsonify({'error': f"Постачальника {supplier} не знайдено"}), 404
+    return jsonify(meta)
+
+@app.route('/search', methods=['GET'])
+def search_catalogue():
+    if catalogue is None:
+        return jsonify({'error': 'Каталог вимкнено (CATALOGUE_DIR не задано).'}), 503
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Не задано пошуковий запит (q).'}), 400
+
+    columns = [c for c in request.args.get('columns', '').split(',') if c.strip()]
+    filenames = set(request.args.getlist('file'))
+    try:
+        limit = int(request.args.get('limit', SEARCH_RESULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'Параметр limit має бути числом.'}), 400
+
+    return jsonify(catalogue.search(query, [c.strip() for c in columns], filenames, limit))
+
+def matches_path():
+    return os.path.join(catalogue.data_dir, "matches.pkl")
+
+
+def load_matches():
+    # Збережені кластери (перечитуються, лише коли файл змінився): (набір списків, кластери) або (None, None)
+    try:
+        mtime = os.stat(matches_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+    with _matches_lock:
+        if _matches["mtime"] == mtime:
+            return _matches["lists"], _matches["clusters"]
+    try:
+        with open(matches_path(), "rb") as fh:
+            stored = pickle.load(fh)
+    except Exception as e:
+        logging.warning(f"Matches: could not load {matches_path()}: {e}")
+        return None, None
+    with _matches_lock:
+        _matches.update(mtime=mtime, lists=stored["lists"], clusters=stored["clusters"])
+    return stored["lists"], stored["clusters"]
+
+
+def schedule_matches_refresh():
+    # Кілька змін поспіль дають один перерахунок: виконується лише останнє поставлене в чергу завдання
+    global _matches_ticket
+    with _matches_lock:
+        _matches_ticket += 1
+        ticket = _matches_ticket
+        _matches["pending"] = True
+    _get_catalogue_pool().submit(refresh_matches, ticket)
+
+
+def refresh_matches(ticket):
+    with _matches_lock:
+        if ticket != _matches_ticket:
+            return
+    try:
+        with open(f"{matches_path()}.lock", "a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # перераховує інший воркер — його результат прочитають усі
+            lists = catalogue.current_lists()
+            if load_matches()[0] == lists:
+                return
+            offers = catalogue.offers_frame(MATCH_COLUMNS + ["price"], lists)
+            with stage_metrics.span("match", rows=len(offers)):
+                clusters = summarize_clusters(offers, cluster_offers(offers))
+            tmp_path = f"{matches_path()}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                pickle.dump({"lists": lists, "clusters": clusters}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, matches_path())
+            logging.info(f"Matched {len(offers)} catalogue rows from {len(lists)} lists into {len(clusters)} clusters.")
+    except Exception as e:
+        logging.error(f"Matches: could not recompute clusters: {e}")
+    finally:
+        with _matches_lock:
+            if ticket == _matches_ticket:
+                _matches["pending"] = False
+
+
+def catalogue_clusters():
+    # (кластери, чи оновлюються): поки перерахунок не завершився, віддаються попередні кластери
+    lists, clusters = load_matches()
+    updating = lists != catalogue.current_lists()
+    if updating:
+        with _matches_lock:
+            pending = _matches["pending"]
+        if not pending:
+            # Каталог змінено без перерахунку в цьому процесі: перший запуск, інший воркер ще рахує чи впав
+            schedule_matches_refresh()
+    if clusters is None:
+        empty = pd.DataFrame(columns=MATCH_COLUMNS + ["price", "file", "supplier"])
+        clusters = summarize_clusters(empty, np.array([], dtype=np.int64))
+    return clusters, updating
+
+
+@app.route('/matches', methods=['GET'])
+def match_offers():
+    # Однакові вина різних постачальників: ?q=, фільтри колонок як у /upload, ?min_offers=, ?min_suppliers=,
+    # ?sort= (типово -offers), ?limit=, ?offset=
+    if catalogue is None:
+        return jsonify({'error': 'Каталог вимкнено (CATALOGUE_DIR не задано).'}), 503
+
+    args = request.args.to_dict()
+    error = query_error(args)
+    minimums = {}
+    for param, column in (("min_offers", "offers"), ("min_suppliers", "suppliers")):
+        value = args.pop(param, "").strip()
+        if value and not value.isdigit():
+            error = error or f"Параметр {param} має бути невід'ємним цілим числом."
+        elif value:
+            minimums[column] = int(value)
+    if error:
+        return jsonify({'error': error}), 400
+
+    clusters, updating = catalogue_clusters()
+    mask = np.ones(len(clusters), dtype=bool)
+    for column, minimum in minimums.items():
+        mask &= clusters[column].to_numpy() >= minimum
+    query = args.pop("q", "").strip()
+    if query:
+        mask &= (clusters["wine_name"].astype(str).str.contains(query, case=False, regex=False, na=False)
+                 | clusters["producer"].astype(str).str.contains(query, case=False, regex=False, na=False)).to_numpy()
+
+    # Загальна кількість рахується до limit/offset
+    page = {param: args.pop(param) for param in ("limit", "offset") if param in args}
+    args.setdefault("sort", "-offers")
+    matched = apply_query_filters(clusters[mask], args)
+    page.setdefault("limit", str(MATCHES_PAGE_SIZE))
+    page = apply_query_filters(matched, page)
+    with stage_metrics.span("serialize", rows=len(page)):
+        records = page.astype(object).where(page.notna(), None).to_dict(orient="records")
+    return jsonify({"total": len(matched), "clusters": records, "updating": updating})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    cache = result_cache.stats()
+    cache_lines = ["# TYPE result_cache_requests_total counter"] + [
+        f'result_cache_requests_total{{outcome="{outcome}"}} {cache[field]}'
+        for outcome, field in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))
+    ]
+    cache_lines += ["# TYPE result_cache_memory_bytes gauge", f"result_cache_memory_bytes {cache['memory_bytes']}"]
+    startup_lines = ["# TYPE app_startup_seconds gauge",
+                     f'app_startup_seconds{{phase="imports"}} {IMPORT_SECONDS:g}',
+                     f'app_startup_seconds{{phase="ready"}} {STARTUP_SECONDS:g}']
+    return Response(stage_metrics.render(cache_lines + startup_lines), mimetype="text/plain; version=0.0.4")
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+def warm_shared_state():
+    # Заповнюється до fork, щоб воркери ділили ці дані copy-on-write, а не будували кожен свої:
+    # кеш назв колонок для типових заголовків та індекси каталогу (numpy-масиви кодів)
+    normalize_columns(HEADER_KEYWORDS + list(column_patterns.values()))
+    if catalogue is not None:
+        catalogue.refresh()
 
-    return jsonify(result)
+warm_shared_state()
+STARTUP_SECONDS = time.perf_counter() - _startup_began
+logging.info(f"Startup: imports {IMPORT_SECONDS:.2f}s, ready in {STARTUP_SECONDS:.2f}s (pid {os.getpid()}).")
 
 if __name__ == '__main__':
     app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
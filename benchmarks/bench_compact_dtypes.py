@@ -0,0 +1,74 @@
+# Пам'ять нормалізованих фреймів до і після compact_frame (category, Int16, float32) для синтетичних прайсів,
+# час стиснення, а також фільтр + JSON і хешування рядків (supplier_diff) на обох варіантах фрейму.
+# Запуск: python benchmarks/bench_compact_dtypes.py [rows ...]
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("CATALOGUE_DIR", "")
+os.environ.setdefault("SUPPLIERS_DIR", "")
+
+import app
+from compact import compact_frame, frame_memory
+from fixtures import CSV_VARIANTS, make_price_list_csv, make_price_list_xlsx
+from supplier_diff import row_hashes
+
+logging.disable(logging.CRITICAL)
+warnings.simplefilter("ignore")
+
+QUERY = {"region": "bor", "year_min": "2010", "sort": "-price", "limit": "1000"}
+
+
+def timed(func, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def normalized_frame(path):
+    app.COMPACT_DTYPES = False
+    with open(path, "rb") as fh:
+        return app.build_normalized_frame(io.BytesIO(fh.read()), os.path.basename(path))
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    print(f"{'file':<38} {'before, MB':>11} {'after, MB':>10} {'ratio':>6} {'compact, s':>11} "
+          f"{'filter+json, s':>15} {'hash rows, s':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            paths = []
+            for variant in CSV_VARIANTS:
+                paths.append(os.path.join(tmp, f"supplier_{variant}_{rows}.csv"))
+                make_price_list_csv(paths[-1], rows, variant)
+            if rows <= 100_000:
+                paths.append(os.path.join(tmp, f"supplier_{rows}.xlsx"))
+                make_price_list_xlsx(paths[-1], rows, sheets=1)
+            for path in paths:
+                df = normalized_frame(path)
+                before = frame_memory(df)
+                (compacted, _), compact_s = timed(lambda: compact_frame(df.copy()), repeat=1)
+                after = frame_memory(compacted)
+                cases = []
+                for frame in (df, compacted):
+                    _, filter_s = timed(lambda: app.records_json_safe(app.apply_query_filters(frame, QUERY)))
+                    _, hash_s = timed(lambda: row_hashes(frame))
+                    cases.append((filter_s, hash_s))
+                name = os.path.basename(path)
+                print(f"{name:<38} {before / 2**20:>11.1f} {after / 2**20:>10.1f} {before / after:>5.1f}x "
+                      f"{compact_s:>11.3f} {cases[0][0]:>6.3f} → {cases[1][0]:<6.3f} {cases[0][1]:>5.3f} → {cases[1][1]:<5.3f}")
+
+
+if __name__ == "__main__":
+    main()
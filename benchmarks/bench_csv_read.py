@@ -0,0 +1,123 @@
+# Порівняння старого циклу кодування×роздільник з одноразовим визначенням діалекту.
+# Запуск: python benchmarks/bench_csv_read.py [rows]
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+logging.disable(logging.CRITICAL)
+
+
+def legacy_try_read_csv(file, filename, encodings=["utf-8", "ISO-8859-1", "cp1252", "utf-16-be", "utf-16", "utf-16-le"]):
+    # Копія try_read_csv_with_encoding до оптимізації
+    common_delimiters = [',', ';', '\t', '|']
+    for enc in encodings:
+        try:
+            file.seek(0)
+            sample_bytes = file.read(4096)
+            if not sample_bytes:
+                continue
+            try:
+                sample_content = sample_bytes.decode(enc)
+            except UnicodeDecodeError:
+                sample_content = sample_bytes.decode(enc, errors='ignore')
+            delimiters_to_try = []
+            try:
+                delimiters_to_try.append(csv.Sniffer().sniff(sample_content).delimiter)
+            except csv.Error:
+                pass
+            for d in common_delimiters:
+                if d not in delimiters_to_try:
+                    delimiters_to_try.append(d)
+            for delim in delimiters_to_try:
+                try:
+                    file.seek(0)
+                    full_content_bytes = file.read()
+                    try:
+                        full_content_str = full_content_bytes.decode(enc)
+                    except UnicodeDecodeError:
+                        full_content_str = full_content_bytes.decode(enc, errors='ignore')
+                    df = pd.read_csv(io.StringIO(full_content_str), header=None, delimiter=delim, engine="python",
+                                     on_bad_lines='skip', skipinitialspace=True, quotechar='"')
+                    if not df.empty and df.dropna(how='all').shape[0] > 0 and df.shape[0] > 1 and df.shape[1] > 1:
+                        return df
+                except Exception:
+                    continue
+        except Exception:
+            continue
+    return pd.DataFrame([{"error": "failed"}])
+
+
+FIXTURES = [
+    ("utf8_comma", "utf-8", ",", False),
+    ("cp1252_semicolon", "cp1252", ";", False),
+    ("utf16_tab", "utf-16", "\t", False),
+    ("latin1_pipe", "ISO-8859-1", "|", False),
+    ("cp1252_preamble", "cp1252", ";", True),
+]
+
+
+def make_fixture(path, rows, encoding, delim, preamble):
+    rnd = random.Random(42)
+    producers = ["Château Margaux", "Domaine Leflaive", "Bodegas Muga", "Weingut Künstler", "Cave de Tain"]
+    regions = ["Bordeaux", "Bourgogne", "Rioja", "Rheingau", "Rhône"]
+    lines = ["Liste de prix 2024", ""] if preamble else []
+    lines.append(delim.join(["Wine", "Producer", "Region", "Vintage", "Format", "Prix HT", "Stock"]))
+    for i in range(rows):
+        price = f"{rnd.uniform(5, 500):.2f}".replace('.', ',') if delim != ',' else f"{rnd.uniform(5, 500):.2f}"
+        lines.append(delim.join([
+            f"Cuvée {i}", rnd.choice(producers), rnd.choice(regions),
+            str(rnd.randint(1990, 2022)), "75cl", price, str(rnd.randint(0, 120)),
+        ]))
+    with open(path, "w", encoding=encoding, newline="") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+
+def _run(impl_name, path, queue):
+    import app
+    impl = legacy_try_read_csv if impl_name == "legacy" else app.try_read_csv_with_encoding
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(path, "rb") as fh:
+        start = time.perf_counter()
+        df = impl(fh, os.path.basename(path))
+        elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, peak_rss - base_rss, df.shape))
+
+
+def measure(impl_name, path):
+    # Кожен замір в окремому процесі, щоб ru_maxrss не змішувався між реалізаціями
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(impl_name, path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'fixture':<18} {'MB':>6} {'impl':<8} {'time, s':>8} {'peak RSS, MB':>13} shape")
+        for name, encoding, delim, preamble in FIXTURES:
+            path = os.path.join(tmp, f"{name}.csv")
+            make_fixture(path, rows, encoding, delim, preamble)
+            size_mb = os.path.getsize(path) / 2**20
+            for impl_name in ("legacy", "current"):
+                elapsed, rss_kb, shape = measure(impl_name, path)
+                print(f"{name:<18} {size_mb:>6.1f} {impl_name:<8} {elapsed:>8.2f} {rss_kb / 1024:>13.1f} {shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Читання Excel: pd.read_excel (openpyxl, DOM книги) проти read_only/calamine-рідера
+# та послідовне читання всіх аркушів проти пулу процесів. Кожен замір — в окремому процесі;
+# пам'ять — пік алокацій tracemalloc (ru_maxrss тут маскується піком під час імпорту pandas).
+# Запуск: python benchmarks/bench_excel_read.py [rows] [sheets]
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from fixtures import PDF_HEADER, price_list_rows
+
+logging.disable(logging.CRITICAL)
+
+
+def write_workbook(path, sheets, rows_per_sheet):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for i in range(sheets):
+            df = pd.DataFrame([["Tarif 2024"], [None], PDF_HEADER] + list(price_list_rows(rows_per_sheet, seed=i)))
+            df.to_excel(writer, sheet_name=f"Sheet {i + 1}", header=False, index=False)
+
+
+def _run(case, path, queue):
+    import excel_extract
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(path, "rb") as fh:
+        if case == "legacy first sheet":
+            rows = len(pd.read_excel(fh, header=None, engine="openpyxl"))
+        elif case == "current first sheet":
+            rows = len(excel_extract.read_sheet(fh))
+        else:
+            sheets = excel_extract.sheet_names(fh)
+            workers = 1 if case == "all sheets, sequential" else excel_extract.EXCEL_WORKERS
+            frames = excel_extract.read_sheets(fh, os.path.basename(path), sheets, workers=workers)
+            rows = sum(len(df) for df in frames.values())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put((elapsed, peak / 2**20, rows))
+
+
+def measure(case, path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(case, path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    sheets = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    import excel_extract
+    print(f"calamine: {excel_extract.HAS_CALAMINE}, cores: {os.cpu_count()}, excel workers: {excel_extract.EXCEL_WORKERS}")
+    with tempfile.TemporaryDirectory() as tmp:
+        big = os.path.join(tmp, "big.xlsx")
+        many = os.path.join(tmp, "many_sheets.xlsx")
+        write_workbook(big, 1, rows)
+        write_workbook(many, sheets, max(rows // sheets, 1))
+        print(f"{'workbook':<18} {'case':<24} {'time, s':>8} {'peak alloc, MB':>14} {'rows':>8}")
+        for label, path, cases in (
+            (f"{rows} rows", big, ("legacy first sheet", "current first sheet")),
+            (f"{sheets} sheets", many, ("all sheets, sequential", "all sheets, pool")),
+        ):
+            for case in cases:
+                elapsed, peak_mb, read_rows = measure(case, path)
+                print(f"{label:<18} {case:<24} {elapsed:>8.2f} {peak_mb:>14.1f} {read_rows:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Мікробенчмарк нормалізації колонок і пошуку рядка заголовка на широких таблицях:
+# попередні реалізації (iterrows, re.search без компіляції) проти поточних.
+# Запуск: python benchmarks/bench_header_detection.py
+import logging
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import app
+
+logging.disable(logging.CRITICAL)
+
+RAW_HEADERS = ["Wine name", "Producer / Domaine", "Appellation", "Region", "Country", "Couleur",
+               "Qty available", "Bottle size", "Prix HT CHF", "Millésime", "Notes", "SKU", "Barcode"]
+
+
+def legacy_normalize_columns(columns):
+    result = []
+    for col in columns:
+        col_str = str(col).lower().strip()
+        col_str = col_str.replace('\n', ' ').replace('\r', '').replace('  ', ' ')
+        matched = False
+        for pattern, replacement in app.column_patterns.items():
+            if re.search(pattern, col_str):
+                col_str = replacement
+                matched = True
+                break
+        result.append(col_str if matched else str(col).strip())
+    return result
+
+
+def legacy_find_best_header_row(df_raw):
+    best_match_count, best_header_idx = 0, -1
+    for idx, row in df_raw.head(20).iterrows():
+        match_count = sum(
+            1 for cell in row if isinstance(cell, str) and any(k in cell.lower() for k in app.HEADER_KEYWORDS)
+        )
+        if match_count > best_match_count:
+            best_match_count, best_header_idx = match_count, idx
+    return best_header_idx if best_match_count >= 2 else df_raw.dropna(how='all').index[0]
+
+
+def make_wide_raw(columns, rows=200, seed=1):
+    rnd = random.Random(seed)
+    headers = [f"{RAW_HEADERS[i % len(RAW_HEADERS)]} {i // len(RAW_HEADERS) or ''}".strip() for i in range(columns)]
+    preamble = [["Tarif 2024"] + [None] * (columns - 1), [None] * columns]
+    body = [[rnd.choice([f"{rnd.uniform(1, 99):.2f}", "Bordeaux", None, rnd.randint(1, 9)]) for _ in range(columns)]
+            for _ in range(rows)]
+    return pd.DataFrame(preamble + [headers] + body), headers
+
+
+def main():
+    print(f"{'columns':>7} {'step':<10} {'legacy, ms':>11} {'current, ms':>12} {'speedup':>8}")
+    for columns in (50, 200, 800):
+        df_raw, headers = make_wide_raw(columns)
+        assert legacy_normalize_columns(headers) == app.normalize_columns(headers)
+        assert legacy_find_best_header_row(df_raw) == app.find_best_header_row(df_raw)
+
+        app.normalize_column_name.cache_clear()
+        cases = [
+            ("normalize", lambda: legacy_normalize_columns(headers), lambda: app.normalize_columns(headers)),
+            ("header", lambda: legacy_find_best_header_row(df_raw), lambda: app.find_best_header_row(df_raw)),
+        ]
+        for step, legacy, current in cases:
+            runs = 20
+            legacy_ms = timeit.timeit(legacy, number=runs) / runs * 1000
+            current_ms = timeit.timeit(current, number=runs) / runs * 1000
+            print(f"{columns:>7} {step:<10} {legacy_ms:>11.2f} {current_ms:>12.2f} {legacy_ms / current_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Зіставлення однакових вин між постачальниками: синтетичні прайси 4 постачальників з різним написанням
+# (діакритика, "Ch."/"Château", порядок слів, формат "75cl"/"0,75 L"/"750ml", одруківки).
+# Час cluster_offers + summarize_clusters, кількість кластерів і якість відносно справжніх вин:
+# повнота — частка вин, усі пропозиції яких потрапили в один кластер; чистота — частка кластерів з одним вином.
+# Запуск: python benchmarks/bench_matching.py [rows ...]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from matching import cluster_offers, summarize_clusters
+
+SUPPLIERS = 4
+PREFIXES = [("Château", "Ch.", "Chateau"), ("Domaine", "Dom.", "Domaine"), ("Weingut", "Weingut", "Wg.")]
+SYLLABLES = ["mar", "gaux", "le", "flai", "ve", "mu", "ga", "kün", "stler", "tain", "rou", "ge", "pa", "vil",
+             "lon", "bel", "air", "mon", "tra", "chet", "sau", "ter", "nes", "cos", "tes", "ri", "o", "ja"]
+NAME_WORDS = ["Rouge", "Blanc", "Réserve", "Grand Vin", "Cuvée", "Vieilles Vignes", "Les Clos", "Premier",
+              "Côte", "Brut", "Rosé", "Sélection"]
+SIZES = {75: ("75cl", "0,75 L", "750ml", "75"), 150: ("150cl", "1,5 L", "1500ml", "Magnum 150cl")}
+
+
+def word(rnd, parts):
+    return "".join(rnd.choice(SYLLABLES, parts)).capitalize()
+
+
+def make_wines(count, rnd):
+    producers = [(rnd.integers(len(PREFIXES)), f"{word(rnd, 2)} {word(rnd, 2)}") for _ in range(max(count // 20, 1))]
+    wines = []
+    for i in range(count):
+        prefix, producer = producers[rnd.integers(len(producers))]
+        words = list(rnd.choice(NAME_WORDS, 2, replace=False)) + [word(rnd, 3)]
+        wines.append((prefix, producer, words, int(rnd.integers(1995, 2023)), int(rnd.choice([75, 75, 75, 150]))))
+    return wines
+
+
+def strip_accents(text):
+    return text.translate(str.maketrans("éèêâûôîçü", "eeeauoicu"))
+
+
+def spelled(wine, supplier, rnd):
+    # Кожен постачальник пише те саме вино по-своєму
+    prefix, producer, words, year, size = wine
+    name = " ".join(words if supplier % 2 == 0 else words[::-1])
+    producer_name = f"{PREFIXES[prefix][supplier % 3]} {producer}"
+    if supplier == 1:
+        name, producer_name = strip_accents(name), strip_accents(producer_name).upper()
+    if rnd.random() < 0.05 and len(name) > 8:
+        cut = int(rnd.integers(1, len(name) - 1))
+        name = name[:cut] + name[cut + 1:]  # одруківка
+    return name, producer_name, str(year), SIZES[size][supplier], round(float(rnd.uniform(5, 500)), 2)
+
+
+def make_offers(rows, seed=7):
+    rnd = np.random.default_rng(seed)
+    wines = make_wines(max(rows * 10 // (SUPPLIERS * 7), 1), rnd)
+    records, truth = [], []
+    for supplier in range(SUPPLIERS):
+        for wine_id in np.flatnonzero(rnd.random(len(wines)) < 0.7):
+            records.append((*spelled(wines[wine_id], supplier, rnd), f"supplier_{supplier}.csv"))
+            truth.append(wine_id)
+    offers = pd.DataFrame(records, columns=["wine_name", "producer", "year", "bottle_size", "price", "file"])
+    return offers.iloc[:rows], np.array(truth[:rows])
+
+
+def quality(labels, truth):
+    pairs = pd.DataFrame({"label": labels, "truth": truth})
+    completeness = (pairs.groupby("truth")["label"].nunique() == 1).mean()
+    purity = (pairs.groupby("label")["truth"].nunique() == 1).mean()
+    return completeness, purity
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    print(f"{'rows':>8} {'wines':>8} {'cluster, s':>11} {'summary, s':>11} {'clusters':>9} {'completeness':>13} {'purity':>7}")
+    for rows in sizes:
+        offers, truth = make_offers(rows)
+        start = time.perf_counter()
+        labels = cluster_offers(offers)
+        cluster_s = time.perf_counter() - start
+        start = time.perf_counter()
+        clusters = summarize_clusters(offers, labels)
+        summary_s = time.perf_counter() - start
+        completeness, purity = quality(labels, truth)
+        print(f"{rows:>8} {len(np.unique(truth)):>8} {cluster_s:>11.2f} {summary_s:>11.2f} {len(clusters):>9} "
+              f"{completeness:>13.1%} {purity:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
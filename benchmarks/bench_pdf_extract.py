@@ -0,0 +1,47 @@
+# Прискорення посторінкового розбору PDF залежно від кількості процесів.
+# Запуск: python benchmarks/bench_pdf_extract.py [pages]
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pdf_extract
+from fixtures import make_price_list_pdf
+
+logging.disable(logging.CRITICAL)
+
+
+def run(path, workers):
+    start = time.perf_counter()
+    with open(path, "rb") as fh:
+        rows = pdf_extract.extract_pdf_rows(fh, os.path.basename(path), workers=workers)
+    elapsed = time.perf_counter() - start
+    pdf_extract._reset_pool()
+    return elapsed, len(rows)
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalogue.pdf")
+        # Кожна 10-та сторінка порожня — перевіряє ранній вихід без extract_table()
+        make_price_list_pdf(path, pages, blank_every=10)
+        pdf_extract.PDF_WORKERS = cores
+        baseline = None
+        print(f"{pages} pages, {cores} cores")
+        print(f"{'workers':>7} {'time, s':>8} {'speedup':>8} rows")
+        for workers in worker_counts:
+            pdf_extract.PDF_WORKERS = workers
+            elapsed, rows = run(path, workers)
+            baseline = baseline or elapsed
+            print(f"{workers:>7} {elapsed:>8.2f} {baseline / elapsed:>8.2f} {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Фільтрація й пагінація результату /upload на вже розібраному (кешованому) фреймі:
+# старий підхід (послідовні зрізи .astype(str).str.lower().str.contains, уся таблиця у відповідь)
+# проти однієї маски, limit/offset/sort і fields.
+# Запуск: python benchmarks/bench_query_pagination.py [rows ...]
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+import app
+from fixtures import price_list_rows
+
+logging.disable(logging.CRITICAL)
+
+QUERIES = {
+    "no filter": {},
+    "region=bor": {"region": "bor"},
+    "region=bor&year=2015": {"region": "bor", "year": "2015"},
+}
+PAGE = {"limit": "100", "fields": "wine_name,producer,price"}
+
+
+def make_frame(rows):
+    df = pd.DataFrame(list(price_list_rows(rows)),
+                      columns=["wine_name", "producer", "region", "year", "bottle_size", "price"])
+    df["price"] = pd.to_numeric(df["price"])
+    return df
+
+
+def legacy_filters(df, args):
+    for param, value in args.items():
+        df = df[df[param].astype(str).str.lower().str.contains(value, na=False)]
+    return df
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def serialized(df):
+    return json.dumps(app.records_json_safe(df), default=str)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [200_000]
+    print(f"{'rows':>8} {'query':<22} {'case':<24} {'filter+json, s':>15} {'payload KB':>11}")
+    for rows in sizes:
+        df = make_frame(rows)
+        for label, args in QUERIES.items():
+            cases = (
+                ("legacy, all rows", lambda: serialized(legacy_filters(df, args))),
+                ("mask, all rows", lambda: serialized(app.apply_query_filters(df, args))),
+                ("mask, limit=100+fields", lambda: serialized(app.apply_query_filters(df, {**args, **PAGE}))),
+                ("mask, sort=-price page", lambda: serialized(
+                    app.apply_query_filters(df, {**args, **PAGE, "sort": "-price"}))),
+            )
+            for case, func in cases:
+                payload, elapsed = timed(func)
+                print(f"{rows:>8} {label:<22} {case:<24} {elapsed:>15.3f} {len(payload) / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
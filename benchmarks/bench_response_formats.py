@@ -0,0 +1,56 @@
+# Час серіалізації/десеріалізації та розмір відповіді /upload: JSON проти Arrow IPC і Parquet.
+# Запуск: python benchmarks/bench_response_formats.py [rows ...]
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+import app
+import columnar
+from fixtures import price_list_rows
+
+logging.disable(logging.CRITICAL)
+
+
+def make_frame(rows):
+    df = pd.DataFrame(list(price_list_rows(rows)),
+                      columns=["wine_name", "producer", "region", "year", "bottle_size", "price"])
+    df["price"] = pd.to_numeric(df["price"])
+    # Частина цін відсутня, як у реальних прайсах
+    df.loc[df.index % 17 == 0, "price"] = np.nan
+    return df
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 500_000]
+    print(f"{'rows':>8} {'format':<8} {'server, s':>10} {'client, s':>10} {'payload MB':>11}")
+    for rows in sizes:
+        frames = {"supplier.xlsx": make_frame(rows)}
+        with app.app.app_context():
+            payload, server = timed(lambda: app.app.json.dumps(
+                {name: app.records_json_safe(df) for name, df in frames.items()}).encode())
+        _, client = timed(lambda: {name: pd.DataFrame(records) for name, records in json.loads(payload).items()})
+        print(f"{rows:>8} {'json':<8} {server:>10.3f} {client:>10.3f} {len(payload) / 2**20:>11.2f}")
+
+        for fmt, writer, mimetype in (("arrow", columnar.arrow_ipc_bytes, columnar.ARROW_STREAM_MIMETYPE),
+                                      ("parquet", columnar.parquet_bytes, columnar.PARQUET_MIMETYPE)):
+            payload, server = timed(lambda: writer(columnar.frames_to_arrow_table(frames, {})))
+            _, client = timed(lambda: columnar.read_upload_response(payload, mimetype))
+            print(f"{rows:>8} {fmt:<8} {server:>10.3f} {client:>10.3f} {len(payload) / 2**20:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
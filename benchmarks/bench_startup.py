@@ -0,0 +1,142 @@
+# Старт і пам'ять воркерів: час "import app" у свіжому процесі (лінивий імпорт PDF/Excel проти попереднього
+# жадібного) і пам'ять W воркерів, що обробили по CSV-файлу — кожен воркер імпортує app сам (gunicorn без
+# preload_app) проти fork від майстра з уже імпортованим app і gc.freeze() (preload_app, gunicorn.conf.py).
+# Пам'ять з /proc/<pid>/smaps_rollup: RSS, PSS (спільні сторінки поділено між процесами) і приватна.
+# Лише Linux. Запуск: python benchmarks/bench_startup.py [workers]
+import gc
+import importlib
+import io
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import make_price_list_csv
+
+IMPORT_RUNS = 5
+IMPORT_CASES = {
+    "lazy (current)": "import app",
+    "eager pdfplumber+openpyxl": "import pdfplumber, openpyxl; import app",
+}
+IMPORT_PROBE = """
+import time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+import json, sys
+rss = [int(l.split()[1]) for l in open("/proc/self/status") if l.startswith("VmRSS:")][0] / 1024
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss, "pdf": "pdfplumber" in sys.modules}}))
+"""
+
+
+def memory_mb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return fields["Rss"], fields["Pss"], fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def handle_file(path):
+    # Робота воркера: один CSV через увесь конвеєр
+    import app
+
+    with open(path, "rb") as fh:
+        app.process_file_universal(io.BytesIO(fh.read()), os.path.basename(path), {})
+
+
+def worker_main(path):
+    # Окремий процес без preload: імпорт app, файл, сигнал готовності й очікування, поки виміряють пам'ять
+    logging.disable(logging.CRITICAL)
+    handle_file(path)
+    print("ready", flush=True)
+    sys.stdin.read(1)
+
+
+def measure_imports(env):
+    print(f"{'import app':<28} {'median, s':>10} {'RSS, MB':>8} {'pdfplumber loaded':>18}")
+    for label, statement in IMPORT_CASES.items():
+        runs = [json.loads(subprocess.run([sys.executable, "-c", IMPORT_PROBE.format(statement=statement)], cwd=ROOT,
+                                          env=env, capture_output=True, text=True, check=True).stdout)
+                for _ in range(IMPORT_RUNS)]
+        print(f"{label:<28} {statistics.median(r['seconds'] for r in runs):>10.3f} "
+              f"{statistics.median(r['rss_mb'] for r in runs):>8.1f} {str(runs[0]['pdf']):>18}")
+
+
+def spawned_workers(path, count, env):
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", path], cwd=ROOT, env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(count)]
+    for proc in procs:
+        proc.stdout.readline()
+    return [proc.pid for proc in procs], lambda: [proc.communicate("x") for proc in procs]
+
+
+def forked_workers(path, count):
+    # Імпорт у "майстрі" до fork, як з preload_app
+    importlib.import_module("app")
+    gc.freeze()
+    pids, releases = [], []
+    for _ in range(count):
+        ready_r, ready_w = os.pipe()
+        release_r, release_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            handle_file(path)
+            os.write(ready_w, b"1")
+            os.read(release_r, 1)
+            os._exit(0)
+        os.read(ready_r, 1)
+        pids.append(pid)
+        releases.append(release_w)
+
+    def release():
+        for fd in releases:
+            os.write(fd, b"1")
+        for pid in pids:
+            os.waitpid(pid, 0)
+    return pids, release
+
+
+def report(label, pids, master_pid=None):
+    rows = [memory_mb(pid) for pid in pids]
+    total_pss = sum(r[1] for r in rows) + (memory_mb(master_pid)[1] if master_pid else 0)
+    print(f"{label:<22} {statistics.mean(r[0] for r in rows):>12.1f} {statistics.mean(r[1] for r in rows):>12.1f} "
+          f"{statistics.mean(r[2] for r in rows):>16.1f} {total_pss:>14.1f}")
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        # Без каталогу, версій постачальників і кешу: вимірюємо лише імпорт і конвеєр
+        os.environ.update({"CATALOGUE_DIR": "", "SUPPLIERS_DIR": "", "RESULT_CACHE_SIZE": "0",
+                           "JOBS_DIR": os.path.join(tmp, "jobs")})
+        env = dict(os.environ)
+        measure_imports(env)
+
+        path = os.path.join(tmp, "supplier.csv")
+        make_price_list_csv(path, 5000)
+        print(f"\n{workers} workers, one CSV each")
+        print(f"{'mode':<22} {'RSS/worker':>12} {'PSS/worker':>12} {'private/worker':>16} {'total PSS, MB':>14}")
+        pids, release = spawned_workers(path, workers, env)
+        report("import per worker", pids)
+        release()
+        logging.disable(logging.CRITICAL)
+        pids, release = forked_workers(path, workers)
+        report("preload + fork", pids, os.getpid())
+        release()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--worker":
+        worker_main(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,105 @@
+# Пікова пам'ять /upload: повна відповідь проти потокової (?stream=ndjson).
+# Для потокового режиму пік має лишатися майже сталим зі зростанням файлу: якщо між найменшим і найбільшим
+# файлом він виріс більше ніж на STREAM_MAX_GROWTH_MB, скрипт завершується з кодом 1
+# (те саме перевіряє benchmarks/test_streaming_memory.py).
+# Запуск: python benchmarks/bench_streaming_memory.py [rows ...]
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import price_list_rows
+
+logging.disable(logging.CRITICAL)
+
+# Без каталогу, версій постачальників і дискового кешу: вимірюється лише сам запит
+os.environ.setdefault("CATALOGUE_DIR", "")
+os.environ.setdefault("SUPPLIERS_DIR", "")
+os.environ.setdefault("RESULT_CACHE_DIR", "")
+
+# Для 50k → 200k рядків потоковий пік росте на ~10 МБ (повна відповідь — на ~150 МБ)
+STREAM_MAX_GROWTH_MB = float(os.environ.get("STREAM_MAX_GROWTH_MB", "25"))
+
+
+def make_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("Tarif professionnel\n\n")
+        fh.write(";".join(["Wine", "Producer", "Region", "Vintage", "Format", "Prix HT"]) + "\n")
+        for row in price_list_rows(rows):
+            row[-1] = row[-1].replace(".", ",")
+            fh.write(";".join(row) + "\n")
+
+
+def _run(mode, path, queue):
+    import app
+    client = app.app.test_client()
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    query = "?stream=ndjson" if mode == "stream" else ""
+    with open(path, "rb") as fh:
+        # Стрімимо файл у запит, а не тримаємо його bytes у тесті
+        response = client.post(f"/upload{query}", data={"files": [(fh, "list.csv")]}, buffered=False)
+        size = 0
+        for part in response.response:
+            size += len(part)
+        response.close()
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak_rss - base_rss) / 1024, size / 2**20))
+
+
+def measure(mode, path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(mode, path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def stream_peak_growth(small, large):
+    # Приріст пікового RSS потокового режиму між файлами на small і large рядків, МБ
+    with tempfile.TemporaryDirectory() as tmp:
+        # Черга завдань дочірніх процесів — у тимчасовому каталозі, а не в data/jobs поточного каталогу
+        os.environ["JOBS_DIR"] = os.path.join(tmp, "jobs")
+        peaks = []
+        for rows in (small, large):
+            path = os.path.join(tmp, f"list_{rows}.csv")
+            make_csv(path, rows)
+            peaks.append(measure("stream", path)[1])
+    return peaks[1] - peaks[0]
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 400_000]
+    peaks = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["JOBS_DIR"] = os.path.join(tmp, "jobs")
+        print(f"{'rows':>9} {'file MB':>8} {'mode':<9} {'time, s':>8} {'peak +RSS, MB':>14} {'resp MB':>8}")
+        for rows in sizes:
+            path = os.path.join(tmp, f"list_{rows}.csv")
+            make_csv(path, rows)
+            file_mb = os.path.getsize(path) / 2**20
+            for mode in ("buffered", "stream"):
+                elapsed, peak_mb, resp_mb = measure(mode, path)
+                peaks[(rows, mode)] = peak_mb
+                print(f"{rows:>9} {file_mb:>8.1f} {mode:<9} {elapsed:>8.2f} {peak_mb:>14.1f} {resp_mb:>8.1f}")
+
+    if len(sizes) > 1:
+        small, large = min(sizes), max(sizes)
+        growth = peaks[(large, "stream")] - peaks[(small, "stream")]
+        print(f"stream peak growth {small}→{large} rows: {growth:.1f} MB (limit {STREAM_MAX_GROWTH_MB:g} MB)")
+        if growth > STREAM_MAX_GROWTH_MB:
+            print("FAIL: streaming peak memory grows with file size")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Дельта між тижневими версіями прайсу: векторизоване хешування рядків і зіставлення ключів
+# (1% змінених цін, 0.5% вилучених і 0.5% нових рядків), а також повний SupplierVersions.update
+# з читанням/записом Parquet.
+# Запуск: python benchmarks/bench_supplier_diff.py [rows ...]
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from fixtures import price_list_rows
+from supplier_diff import SupplierVersions, diff_positions, row_hashes
+
+logging.disable(logging.CRITICAL)
+
+
+def make_versions(rows):
+    old = pd.DataFrame(list(price_list_rows(rows)),
+                       columns=["wine_name", "producer", "region", "year", "bottle_size", "price"])
+    old["price"] = pd.to_numeric(old["price"])
+    rnd = np.random.default_rng(7)
+    new = old.copy()
+    changed = rnd.choice(rows, rows // 100, replace=False)
+    new.loc[changed, "price"] = new.loc[changed, "price"] * 1.05
+    new = new.drop(index=rnd.choice(rows, rows // 200, replace=False))
+    added = old.sample(rows // 200, random_state=7).assign(wine_name=lambda df: "New " + df["wine_name"])
+    return old, pd.concat([new, added], ignore_index=True)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 500_000]
+    print(f"{'rows':>8} {'hash new, s':>12} {'diff, s':>8} {'update(), s':>12} {'added':>7} {'changed':>8} {'removed':>8}")
+    for rows in sizes:
+        old, new = make_versions(rows)
+        old_keys, old_content = row_hashes(old)
+        (new_keys, new_content), hash_s = timed(lambda: row_hashes(new))
+        (added, changed, removed), diff_s = timed(lambda: diff_positions(old_keys, old_content, new_keys, new_content))
+        with tempfile.TemporaryDirectory() as tmp:
+            versions = SupplierVersions(tmp)
+            versions.update("bench", "v1.csv", "v1", old)
+            _, update_s = timed(lambda: versions.update("bench", "v2.csv", "v2", new))
+        print(f"{rows:>8} {hash_s:>12.3f} {diff_s:>8.3f} {update_s:>12.3f} {len(added):>7} {len(changed):>8} {len(removed):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Латентність /upload для пакетів з 1–16 змішаних файлів (CSV/XLSX/PDF):
+# послідовна обробка (UPLOAD_WORKERS=1) проти пулу.
+# Запуск: python benchmarks/bench_upload_batch.py [workers]
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+import app
+from fixtures import PDF_HEADER, make_price_list_pdf, price_list_rows
+
+logging.disable(logging.CRITICAL)
+
+BATCH_SIZES = [1, 2, 4, 8, 16]
+
+
+def make_files(tmp, count):
+    files = []
+    for i in range(count):
+        kind = ("csv", "xlsx", "pdf")[i % 3]
+        path = os.path.join(tmp, f"supplier_{i}.{kind}")
+        if kind == "pdf":
+            make_price_list_pdf(path, pages=10, seed=i)
+        else:
+            df = pd.DataFrame([PDF_HEADER] + list(price_list_rows(20_000 if kind == "csv" else 5_000, seed=i)))
+            if kind == "csv":
+                df.to_csv(path, sep=";", header=False, index=False)
+            else:
+                df.to_excel(path, header=False, index=False)
+        with open(path, "rb") as fh:
+            files.append((fh.read(), os.path.basename(path)))
+    return files
+
+
+def run_batch(client, files):
+    # Порожній кеш, щоб кожен прогін справді розбирав файли
+    app.result_cache = app.ResultCache(max_entries=0)
+    data = {"files": [(io.BytesIO(content), name) for content, name in files]}
+    start = time.perf_counter()
+    response = client.post("/upload", data=data)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    return elapsed
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(4, os.cpu_count() or 1)
+    client = app.app.test_client()
+    app.UPLOAD_REQUEST_TIMEOUT = 600
+    with tempfile.TemporaryDirectory() as tmp:
+        all_files = make_files(tmp, max(BATCH_SIZES))
+        print(f"cores: {os.cpu_count()}, pool workers: {workers}")
+        print(f"{'files':>5} {'sequential, s':>14} {'pool, s':>8} {'speedup':>8}")
+        for size in BATCH_SIZES:
+            batch = all_files[:size]
+            app.UPLOAD_WORKERS = 1
+            sequential = run_batch(client, batch)
+            app.UPLOAD_WORKERS = workers
+            pooled = run_batch(client, batch)
+            print(f"{size:>5} {sequential:>14.2f} {pooled:>8.2f} {sequential / pooled:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Синтетичні прайс-листи для бенчмарків.
+# Генерація набору файлів: python benchmarks/fixtures.py <каталог> [rows]
+import csv
+import math
+import os
+import random
+import sys
+
+PRODUCERS = ["Chateau Margaux", "Domaine Leflaive", "Bodegas Muga", "Weingut Kunstler", "Cave de Tain"]
+ACCENTED_PRODUCERS = ["Château d'Yquem", "Domaine de la Romanée-Conti", "Bodegas Muga", "Weingut Künstler",
+                      "Cave de Tain"]
+REGIONS = ["Bordeaux", "Bourgogne", "Rioja", "Rheingau", "Rhone"]
+PDF_HEADER = ["Wine", "Producer", "Region", "Vintage", "Format", "Price"]
+FRENCH_HEADER = ["Nom", "Domaine", "Region", "Millésime", "Format", "Prix HT"]
+# Службові рядки над таблицею, як у реальних прайсах постачальників
+PREAMBLE = [["Tarif 2024"], ["Prix HT en CHF, départ cave"], []]
+PDF_ROWS_PER_PAGE = 40
+
+# Варіанти CSV: кодування, роздільник, десяткова кома в цінах
+CSV_VARIANTS = {
+    "utf8-comma": ("utf-8", ",", False),
+    "cp1252-semicolon": ("cp1252", ";", True),
+    "utf16-tab": ("utf-16", "\t", True),
+}
+
+
+def price_list_rows(count, seed=42, producers=PRODUCERS):
+    rnd = random.Random(seed)
+    for i in range(count):
+        yield [
+            f"Cuvee {i}", rnd.choice(producers), rnd.choice(REGIONS),
+            str(rnd.randint(1990, 2022)), "75cl", f"{rnd.uniform(5, 500):.2f}",
+        ]
+
+
+def supplier_rows(count, seed=42, comma_decimals=False):
+    for row in price_list_rows(count, seed, ACCENTED_PRODUCERS):
+        if comma_decimals:
+            row[-1] = row[-1].replace(".", ",")
+        yield row
+
+
+def make_price_list_csv(path, rows, variant="utf8-comma", seed=42):
+    encoding, delimiter, comma_decimals = CSV_VARIANTS[variant]
+    with open(path, "w", encoding=encoding, newline="") as fh:
+        writer = csv.writer(fh, delimiter=delimiter)
+        writer.writerows(PREAMBLE)
+        writer.writerow(FRENCH_HEADER if comma_decimals else PDF_HEADER)
+        writer.writerows(supplier_rows(rows, seed, comma_decimals))
+
+
+def make_price_list_xlsx(path, rows, sheets=3, seed=42):
+    from openpyxl import Workbook
+
+    # write_only пише рядки потоком — інакше книга на 1M рядків не вміщається в пам'ять
+    workbook = Workbook(write_only=True)
+    per_sheet = math.ceil(rows / sheets)
+    for i in range(sheets):
+        sheet = workbook.create_sheet(f"{REGIONS[i % len(REGIONS)]} {i + 1}")
+        for row in PREAMBLE:
+            sheet.append(row)
+        sheet.append(PDF_HEADER)
+        for wine, producer, region, vintage, size, price in supplier_rows(min(per_sheet, rows - i * per_sheet), seed + i):
+            sheet.append([wine, producer, region, int(vintage), size, float(price)])
+    workbook.save(path)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(rows):
+    # Таблиця з лініями сітки — так extract_table() знаходить її стратегією "lines"
+    col_width, row_height, left, top = 90, 18, 30, 800
+    ops = ["0.5 w"]
+    height = row_height * len(rows)
+    width = col_width * len(PDF_HEADER)
+    for r in range(len(rows) + 1):
+        y = top - r * row_height
+        ops.append(f"{left} {y} m {left + width} {y} l S")
+    for c in range(len(PDF_HEADER) + 1):
+        x = left + c * col_width
+        ops.append(f"{x} {top} m {x} {top - height} l S")
+    ops.append("BT /F1 8 Tf")
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            x = left + c * col_width + 3
+            y = top - (r + 1) * row_height + 5
+            ops.append(f"1 0 0 1 {x} {y} Tm ({_pdf_escape(cell)}) Tj")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def make_price_list_pdf(path, pages, rows_per_page=40, blank_every=0, seed=42):
+    rows = price_list_rows(pages * rows_per_page, seed)
+    # 1: catalog, 2: pages, 3: font, далі пари page/content
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for p in range(pages):
+        page_id, content_id = 4 + p * 2, 5 + p * 2
+        kids.append(f"{page_id} 0 R")
+        if blank_every and p % blank_every == blank_every - 1:
+            stream = b""
+        else:
+            page_rows = [next(rows) for _ in range(rows_per_page)]
+            if p == 0:
+                page_rows = [PDF_HEADER] + page_rows[:-1]
+            stream = _page_stream(page_rows)
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n"
+    xref_pos = len(out)
+    count = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % count
+    for obj_id in range(1, count):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref_pos)
+    with open(path, "wb") as fh:
+        fh.write(out)
+
+
+def make_supplier_files(out_dir, rows):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for variant in CSV_VARIANTS:
+        paths.append(os.path.join(out_dir, f"supplier_{variant}_{rows}.csv"))
+        make_price_list_csv(paths[-1], rows, variant)
+    paths.append(os.path.join(out_dir, f"supplier_{rows}.xlsx"))
+    make_price_list_xlsx(paths[-1], rows)
+    paths.append(os.path.join(out_dir, f"supplier_{rows}.pdf"))
+    make_price_list_pdf(paths[-1], pages=math.ceil(rows / PDF_ROWS_PER_PAGE))
+    return paths
+
+
+if __name__ == "__main__":
+    for generated in make_supplier_files(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1000):
+        print(generated)
@@ -0,0 +1,234 @@
+# Набір бенчмарків конвеєра: синтетичні прайс-листи CSV (різні кодування/роздільники), XLSX (кілька аркушів)
+# і PDF від 1k до 1M рядків, прогін через process_file_universal і POST /upload (Flask test client).
+# Кожен випадок — в окремому процесі: латентність p50/p99, пропускна здатність, пік RSS.
+# Результати зберігаються в JSON для порівняння між комітами:
+#   python benchmarks/run_suite.py --sizes 1000,10000 --output before.json
+#   python benchmarks/run_suite.py --sizes 1000,10000 --compare before.json
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from fixtures import CSV_VARIANTS, PDF_ROWS_PER_PAGE, make_price_list_csv, make_price_list_pdf, make_price_list_xlsx
+
+FORMATS = ["csv", "xlsx", "pdf"]
+TARGETS = ["process_file_universal", "upload"]
+XLSX_SHEETS = 3
+# Ліміт на один випадок (усі повтори) у дочірньому процесі
+CASE_TIMEOUT = float(os.environ.get("BENCH_CASE_TIMEOUT", "1800"))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def make_cases(tmp, formats, sizes, max_pdf_rows):
+    # (назва, шлях, query-параметри, кількість рядків у файлі)
+    cases = []
+    for rows in sizes:
+        if "csv" in formats:
+            for variant in CSV_VARIANTS:
+                path = os.path.join(tmp, f"supplier_{variant}_{rows}.csv")
+                make_price_list_csv(path, rows, variant)
+                cases.append((f"csv/{variant}/{rows}", path, {}, rows))
+        if "xlsx" in formats:
+            path = os.path.join(tmp, f"supplier_{rows}.xlsx")
+            make_price_list_xlsx(path, rows, sheets=XLSX_SHEETS)
+            cases.append((f"xlsx/{XLSX_SHEETS}-sheets/{rows}", path, {"sheets": "all"}, rows))
+        if "pdf" in formats:
+            if rows > max_pdf_rows:
+                print(f"skip pdf/{rows}: more than --max-pdf-rows ({max_pdf_rows})")
+                continue
+            path = os.path.join(tmp, f"supplier_{rows}.pdf")
+            pages = -(-rows // PDF_ROWS_PER_PAGE)
+            make_price_list_pdf(path, pages=pages)
+            cases.append((f"pdf/{pages}-pages/{rows}", path, {}, rows))
+    return cases
+
+
+def count_rows(result):
+    # Повертає (рядки, помилки) з відповіді у форматі /upload
+    if isinstance(result, dict):
+        counts = [count_rows(records) for records in result.values()]
+        return sum(c[0] for c in counts), sum(c[1] for c in counts)
+    errors = sum(1 for record in result if "error" in record and len(record) == 1)
+    return len(result) - errors, errors
+
+
+def _run_case(path, args, target, repeat, queue):
+    logging.disable(logging.CRITICAL)
+    import app
+    import excel_extract
+    import pdf_extract
+
+    try:
+        _run_case_measured(app, path, args, target, repeat, queue)
+    finally:
+        # Живі процеси пулів PDF/Excel не дають дочірньому процесу завершитись, і proc.join() чекав би вічно
+        pdf_extract.shutdown_pool()
+        excel_extract.shutdown_pool()
+
+
+def _run_case_measured(app, path, args, target, repeat, queue):
+    # Без кешу і каталогу: кожен повтор справді розбирає файл
+    app.result_cache = app.ResultCache(max_entries=0)
+    app.catalogue = None
+    app.UPLOAD_REQUEST_TIMEOUT = 3600
+    client = app.app.test_client()
+    filename = os.path.basename(path)
+    with open(path, "rb") as fh:
+        content = fh.read()
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def run_once():
+        start = time.perf_counter()
+        if target == "upload":
+            response = client.post("/upload", query_string=args,
+                                   data={"files": [(io.BytesIO(content), filename)]})
+            assert response.status_code == 200, response.status_code
+            result = response.get_json()
+        else:
+            result = app.process_file_universal(io.BytesIO(content), filename, args)
+        return time.perf_counter() - start, count_rows(result)
+
+    # Перший прогін окремо: лінивий імпорт, старт пулів процесів
+    cold_s, _ = run_once()
+    latencies, rows = [], (0, 0)
+    for _ in range(repeat):
+        elapsed, rows = run_once()
+        latencies.append(elapsed)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        "bytes": len(content), "cold_s": cold_s, "latencies_s": latencies,
+        "output_rows": rows[0], "errors": rows[1],
+        "base_rss_mb": base_rss / 1024, "peak_rss_mb": peak_rss / 1024,
+    })
+
+
+def measure(path, args, target, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(path, args, target, repeat, queue))
+    proc.start()
+    try:
+        result = queue.get(timeout=CASE_TIMEOUT)
+    except queue_module.Empty:
+        proc.terminate()
+        raise RuntimeError(f"{path}: benchmark case did not finish in {CASE_TIMEOUT:g}s")
+    finally:
+        proc.join(timeout=60)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+    return result
+
+
+def summarize(case, rows, target, raw):
+    latencies = raw.pop("latencies_s")
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        "case": case, "target": target, "rows": rows, "repeat": len(latencies),
+        "p50_s": round(float(p50), 4), "p99_s": round(float(p99), 4), "mean_s": round(float(np.mean(latencies)), 4),
+        "rows_per_s": round(rows / p50) if p50 else None,
+        "mb_per_s": round(raw["bytes"] / 2**20 / p50, 2) if p50 else None,
+        **{k: round(v, 4) if isinstance(v, float) else v for k, v in raw.items()},
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = {(r["case"], r["target"]): r for r in json.load(fh)["results"]}
+    regressions = 0
+    print(f"\nvs {baseline_path} (regression threshold {threshold:.0%})")
+    print(f"{'case':<32} {'target':<24} {'p50 before':>10} {'p50 now':>9} {'change':>8}")
+    for r in results:
+        old = baseline.get((r["case"], r["target"]))
+        if old is None or not old["p50_s"]:
+            continue
+        change = r["p50_s"] / old["p50_s"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{r['case']:<32} {r['target']:<24} {old['p50_s']:>10.3f} {r['p50_s']:>9.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки обробки прайс-листів")
+    parser.add_argument("--sizes", default="1000,10000", help="кількість рядків через кому, напр. 1000,10000,100000,1000000")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-pdf-rows", type=int, default=100_000,
+                        help="PDF більшого розміру пропускаються (1M рядків — це 25 000 сторінок)")
+    parser.add_argument("--output", help="JSON з результатами (типово benchmarks/results/<коміт>.json)")
+    parser.add_argument("--compare", help="JSON попереднього прогону для порівняння p50")
+    parser.add_argument("--threshold", type=float, default=0.10, help="відносне сповільнення p50, що вважається регресією")
+    opts = parser.parse_args()
+
+    sizes = [int(s) for s in opts.sizes.split(",") if s.strip()]
+    formats = [f.strip() for f in opts.formats.split(",") if f.strip()]
+    targets = [t.strip() for t in opts.targets.split(",") if t.strip()]
+    revision = git_revision()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Черга задач і каталог app не мають писати в робочий data/
+        os.environ["JOBS_DIR"] = os.path.join(tmp, "jobs")
+        os.environ["CATALOGUE_DIR"] = ""
+        cases = make_cases(tmp, formats, sizes, opts.max_pdf_rows)
+        print(f"revision: {revision}, cores: {os.cpu_count()}, repeat: {opts.repeat}")
+        print(f"{'case':<32} {'target':<24} {'p50, s':>8} {'p99, s':>8} {'rows/s':>10} {'MB/s':>7} {'peak RSS, MB':>12}")
+        for case, path, args, rows in cases:
+            for target in targets:
+                r = summarize(case, rows, target, measure(path, args, target, opts.repeat))
+                results.append(r)
+                note = f"  ({r['errors']} errors, {r['output_rows']} rows out)" if r["errors"] or r["output_rows"] != rows else ""
+                print(f"{case:<32} {target:<24} {r['p50_s']:>8.3f} {r['p99_s']:>8.3f} {r['rows_per_s'] or 0:>10} "
+                      f"{r['mb_per_s'] or 0:>7.2f} {r['peak_rss_mb']:>12.1f}{note}")
+
+    report = {
+        "meta": {
+            "revision": revision, "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "repeat": opts.repeat,
+        },
+        "results": results,
+    }
+    output = opts.output or os.path.join(RESULTS_DIR, f"{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    print(f"saved {output}")
+
+    if opts.compare and compare(results, opts.compare, opts.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
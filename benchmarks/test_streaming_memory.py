@@ -0,0 +1,8 @@
+# Регресійна перевірка потокового /upload: пікова пам'ять не росте разом із розміром файлу.
+# Запуск: python -m pytest benchmarks/test_streaming_memory.py
+from bench_streaming_memory import STREAM_MAX_GROWTH_MB, stream_peak_growth
+
+
+def test_stream_peak_does_not_grow_with_file_size():
+    growth = stream_peak_growth(50_000, 200_000)
+    assert growth < STREAM_MAX_GROWTH_MB, f"stream peak grew by {growth:.1f} MB for 4x more rows"
@@ -0,0 +1,370 @@
+import datetime
+import logging
+import os
+import pickle
+import re
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from compact import wire_series
+
+SEARCH_RESULT_LIMIT = 500
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def base_column_name(col_name):
+    return re.sub(r'_\d+$', '', str(col_name))
+
+
+def build_field_index(values):
+    # Індексуються унікальні значення: у прайсах producer/region/country повторюються тисячі разів
+    codes, uniques = pd.factorize(values.str.lower(), use_na_sentinel=True)
+    postings = {}
+    for value_id, value in enumerate(uniques):
+        for gram in trigrams(value):
+            postings.setdefault(gram, []).append(value_id)
+    return {
+        "uniques": pa.array(uniques, type=pa.string()),
+        "codes": codes.astype(np.int32),
+        "postings": {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()},
+    }
+
+
+def match_field(field_index, query):
+    uniques = field_index["uniques"]
+    grams = trigrams(query)
+    if grams:
+        candidate_ids = None
+        for gram in sorted(grams, key=lambda g: len(field_index["postings"].get(g, ()))):
+            ids = field_index["postings"].get(gram)
+            if ids is None:
+                return np.array([], dtype=np.int32)
+            candidate_ids = ids if candidate_ids is None else np.intersect1d(candidate_ids, ids, assume_unique=True)
+            # Небагато кандидатів дешевше перевірити напряму, ніж перетинати з довгими списками
+            if len(candidate_ids) <= 256:
+                break
+        candidates = uniques.take(pa.array(candidate_ids))
+    else:
+        # Запит коротший за триграму — перевіряємо всі унікальні значення
+        candidate_ids = np.arange(len(uniques), dtype=np.int32)
+        candidates = uniques
+    # Триграми можуть збігтися не поспіль, тож кандидатів перевіряємо точно
+    found = pc.match_substring(candidates, query).to_numpy(zero_copy_only=False)
+    return candidate_ids[found]
+
+
+def remember_name(names, name, seen_at, supplier):
+    # Для кожного імені — останнє завантаження; порожній постачальник не затирає вказаного раніше
+    previous_at, previous_supplier = names.get(name, ("", ""))
+    if seen_at >= previous_at:
+        names[name] = (seen_at, supplier or previous_supplier)
+    elif supplier and not previous_supplier:
+        names[name] = (previous_at, supplier)
+
+
+class Catalogue:
+    def __init__(self, data_dir, canonical_columns):
+        self.data_dir = data_dir
+        self.canonical_columns = set(canonical_columns)
+        self._segments = {}
+        self._tables = {}
+        # Усі імена, під якими список завантажували: {list_id: {ім'я: (коли востаннє, постачальник)}} і mtime файлу імен
+        self._names = {}
+        self._names_mtime = {}
+        self._lock = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _data_path(self, list_id):
+        return os.path.join(self.data_dir, f"{list_id}.parquet")
+
+    def _index_path(self, list_id):
+        return os.path.join(self.data_dir, f"{list_id}.index.pkl")
+
+    def _names_path(self, list_id):
+        return os.path.join(self.data_dir, f"{list_id}.names")
+
+    def record_name(self, list_id, name, seen_at=None, supplier=""):
+        # Той самий вміст під іншим ім'ям — той самий список; ім'я дописується рядком (O_APPEND, без гонок між воркерами)
+        seen_at = seen_at or datetime.datetime.now().isoformat(timespec="seconds")
+        supplier = " ".join(supplier.split())
+        with open(self._names_path(list_id), "a", encoding="utf-8") as fh:
+            fh.write(f"{seen_at}\t{name}\t{supplier}\n")
+        with self._lock:
+            remember_name(self._names.setdefault(list_id, {}), name, seen_at, supplier)
+
+    def _load_names(self, list_id):
+        path = self._names_path(list_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._names_mtime.get(list_id) == mtime:
+                return
+        names = {}
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                seen_at, name, supplier = (line.rstrip("\n").split("\t") + ["", ""])[:3]
+                if name:
+                    remember_name(names, name, seen_at, supplier)
+        with self._lock:
+            self._names[list_id] = names
+            self._names_mtime[list_id] = mtime
+
+    def names(self, list_id):
+        with self._lock:
+            segment = self._segments.get(list_id) or {}
+            names = {name: seen_at for name, (seen_at, _) in self._names.get(list_id, {}).items()}
+        if segment.get("filename") and segment["filename"] not in names:
+            names[segment["filename"]] = segment["ingested_at"]
+        return names
+
+    def supplier(self, list_id):
+        # Останній явно вказаний постачальник (/suppliers/<назва>/delta або /upload?supplier=), інакше ""
+        with self._lock:
+            tagged = [entry for entry in self._names.get(list_id, {}).values() if entry[1]]
+        return max(tagged)[1] if tagged else ""
+
+    def current_lists(self):
+        # {list_id: постачальник} для /matches. Постачальник — явна назва; без неї — назва списку з тими самими
+        # байтами, надісланого з назвою, або ім'я файлу. Від кожного постачальника (і аркуша книги) рахується
+        # лише список, завантажений останнім: попередні тижневі прайси лишаються в /search, але не в цінах
+        list_ids = self.list_ids()
+        with self._lock:
+            segments = {list_id: self._segments[list_id] for list_id in list_ids if list_id in self._segments}
+        tagged = {list_id: self.supplier(list_id) for list_id in segments}
+        by_content = {}
+        for list_id, supplier in tagged.items():
+            if supplier:
+                by_content.setdefault(segments[list_id].get("content", "").split("#")[0], supplier)
+        latest = {}
+        for list_id, segment in segments.items():
+            filename, _, sheet = segment["filename"].partition("#")
+            supplier = (tagged[list_id] or by_content.get(segment.get("content", "").split("#")[0])
+                        or os.path.splitext(filename)[0])
+            slot = (supplier.casefold(), sheet)
+            seen_at = max(self.names(list_id).values())
+            if slot not in latest or seen_at > latest[slot][0]:
+                latest[slot] = (seen_at, list_id, supplier)
+        return {list_id: supplier for _, list_id, supplier in sorted(latest.values(), key=lambda item: item[1])}
+
+    def to_catalogue_table(self, df, filename, ingested_at, content=None):
+        columns = [c for c in df.columns if base_column_name(c) in self.canonical_columns]
+        frame = pd.DataFrame(index=range(len(df)))
+        for col in columns:
+            series = wire_series(df[col].reset_index(drop=True))
+            frame[col] = series if pd.api.types.is_numeric_dtype(series) else series.astype("string")
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        return table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"filename": filename.encode(),
+            b"ingested_at": ingested_at.encode(),
+            b"content": (content or "").encode(),
+        })
+
+    def build_segment(self, table):
+        metadata = table.schema.metadata or {}
+        fields = {}
+        for col in table.column_names:
+            if pa.types.is_string(table.schema.field(col).type) or pa.types.is_large_string(table.schema.field(col).type):
+                fields[col] = build_field_index(table.column(col).to_pandas())
+        return {
+            "filename": metadata.get(b"filename", b"").decode(),
+            "ingested_at": metadata.get(b"ingested_at", b"").decode(),
+            # Хеш байтів файлу без версії конвеєра: однаковий для тих самих байтів до і після зміни PIPELINE_VERSION
+            "content": metadata.get(b"content", b"").decode(),
+            "rows": table.num_rows,
+            "fields": fields,
+        }
+
+    def _write_segment(self, list_id, segment):
+        tmp_path = f"{self._index_path(list_id)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(segment, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._index_path(list_id))
+
+    def add_list(self, list_id, filename, df, content=None, supplier=""):
+        # Повторне завантаження тих самих байтів під іншим ім'ям лише додає ім'я до наявного списку
+        with self._lock:
+            known = list_id in self._segments
+        if known or os.path.exists(self._index_path(list_id)):
+            self.record_name(list_id, filename, supplier=supplier)
+            self.refresh()
+            return False
+
+        ingested_at = datetime.datetime.now().isoformat(timespec="seconds")
+        table = self.to_catalogue_table(df, filename, ingested_at, content)
+        if not table.num_columns:
+            logging.info(f"{filename}: No canonical columns, not added to catalogue.")
+            return False
+        tmp_path = f"{self._data_path(list_id)}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self._data_path(list_id))
+        self.record_name(list_id, filename, ingested_at, supplier)
+        # Індекс пишеться останнім: його наявність означає, що список повністю збережено
+        segment = self.build_segment(table)
+        self._write_segment(list_id, segment)
+        with self._lock:
+            self._segments[list_id] = segment
+        logging.info(f"{filename}: Added {table.num_rows} rows to catalogue as {list_id}.")
+        if content:
+            self.drop_superseded(list_id, content)
+        return True
+
+    def drop_superseded(self, list_id, content):
+        # Той самий вміст, оброблений попередньою версією конвеєра: імена переходять до нового списку, старий видаляється
+        with self._lock:
+            superseded = [other for other, segment in self._segments.items()
+                          if other != list_id and segment.get("content") == content]
+        for other in superseded:
+            supplier = self.supplier(other)
+            for name, seen_at in self.names(other).items():
+                self.record_name(list_id, name, seen_at, supplier)
+            self.remove_list(other)
+            logging.info(f"Catalogue: {other} superseded by {list_id}.")
+
+    def remove_list(self, list_id):
+        # Індекс видаляється першим: без нього інші воркери вже не бачать список
+        for path in (self._index_path(list_id), self._data_path(list_id), self._names_path(list_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        with self._lock:
+            self._segments.pop(list_id, None)
+            self._tables.pop(list_id, None)
+            self._names.pop(list_id, None)
+            self._names_mtime.pop(list_id, None)
+
+    def refresh(self):
+        # Підхоплює списки, додані чи видалені іншими воркерами gunicorn, і нові імена вже відомих списків
+        present = {name[:-len(".index.pkl")] for name in os.listdir(self.data_dir) if name.endswith(".index.pkl")}
+        with self._lock:
+            for list_id in set(self._segments) - present:
+                self._segments.pop(list_id)
+                self._tables.pop(list_id, None)
+                self._names.pop(list_id, None)
+                self._names_mtime.pop(list_id, None)
+        for list_id in present:
+            self._load_names(list_id)
+            name = f"{list_id}.index.pkl"
+            with self._lock:
+                if list_id in self._segments:
+                    continue
+            try:
+                with open(os.path.join(self.data_dir, name), "rb") as fh:
+                    segment = pickle.load(fh)
+            except Exception as e:
+                logging.warning(f"Catalogue: could not load index {name}: {e}")
+                continue
+            with self._lock:
+                self._segments[list_id] = segment
+
+    def rebuild(self):
+        rebuilt = 0
+        for name in sorted(os.listdir(self.data_dir)):
+            if not name.endswith(".parquet"):
+                continue
+            list_id = name[:-len(".parquet")]
+            segment = self.build_segment(pq.read_table(self._data_path(list_id)))
+            self._write_segment(list_id, segment)
+            with self._lock:
+                self._segments[list_id] = segment
+            rebuilt += 1
+        return rebuilt
+
+    def _table(self, list_id):
+        table = self._tables.get(list_id)
+        if table is None:
+            table = pq.read_table(self._data_path(list_id), memory_map=True)
+            self._tables[list_id] = table
+        return table
+
+    def search(self, query, columns=None, filenames=None, limit=SEARCH_RESULT_LIMIT):
+        self.refresh()
+        query = query.strip().lower()
+        columns = set(columns or self.canonical_columns)
+        with self._lock:
+            segments = sorted(self._segments.items(), key=lambda item: item[1]["ingested_at"])
+
+        results, total = [], 0
+        for list_id, segment in segments:
+            label = segment["filename"]
+            if filenames:
+                # Фільтр за будь-яким ім'ям, під яким список завантажували; у відповіді — те, що збіглося
+                matched = [name for name in self.names(list_id) if name in filenames]
+                if not matched:
+                    continue
+                label = label if label in matched else matched[0]
+            row_mask = None
+            for col, field_index in segment["fields"].items():
+                if base_column_name(col) not in columns:
+                    continue
+                value_ids = match_field(field_index, query)
+                if len(value_ids):
+                    col_mask = np.isin(field_index["codes"], value_ids)
+                    row_mask = col_mask if row_mask is None else row_mask | col_mask
+            if row_mask is None:
+                continue
+            rows = np.flatnonzero(row_mask)
+            total += len(rows)
+            if len(results) < limit and len(rows):
+                try:
+                    table = self._table(list_id)
+                except FileNotFoundError:
+                    continue  # список щойно замінено новою версією
+                taken = table.take(rows[:limit - len(results)]).to_pylist()
+                results.extend({"file": label, **row} for row in taken)
+        return {"query": query, "total": total, "results": results}
+
+    def list_ids(self):
+        self.refresh()
+        with self._lock:
+            return tuple(sorted(self._segments))
+
+    def offers_frame(self, columns, lists=None):
+        # Списки каталогу ({list_id: постачальник}) одним фреймом (лише потрібні колонки) з колонками file і supplier —
+        # для зіставлення між постачальниками
+        lists = self.current_lists() if lists is None else lists
+        frames = []
+        for list_id, supplier in lists.items():
+            with self._lock:
+                segment = self._segments.get(list_id)
+            if segment is None:
+                continue
+            try:
+                table = self._table(list_id)
+            except FileNotFoundError:
+                continue  # список щойно замінено новою версією
+            frame = table.select([c for c in columns if c in table.column_names]).to_pandas()
+            frames.append(frame.assign(file=segment["filename"], supplier=supplier))
+        if not frames:
+            return pd.DataFrame(columns=list(columns) + ["file", "supplier"])
+        return pd.concat(frames, ignore_index=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lists": len(self._segments),
+                "rows": sum(s["rows"] for s in self._segments.values()),
+                "data_dir": self.data_dir,
+            }
+
+
+if __name__ == "__main__":
+    # Офлайн-перебудова індексу: python catalogue.py rebuild [каталог]
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python catalogue.py rebuild [data_dir]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from app import column_patterns
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else os.environ.get("CATALOGUE_DIR", os.path.join("data", "catalogue"))
+    count = Catalogue(data_dir, column_patterns.values()).rebuild()
+    logging.info(f"Rebuilt catalogue index for {count} lists in {data_dir}.")
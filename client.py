@@ -2,8 +2,9 @@ import streamlit as st
 import requests
 import pandas as pd
 from io import BytesIO
-import re 
 import os
+import time
+from columnar import ARROW_STREAM_MIMETYPE, read_upload_response
 
 column_patterns = {
     r"\bwine\b|\bproduct\b|\bdescription\b|\bnom\b": "wine_name",
@@ -18,6 +19,11 @@ column_patterns = {
     r"\b(millésime|year|vintage)\b": "year"
 }
 searchable_column_categories = sorted(list(set(column_patterns.values())))
+SERVER_URL = os.environ.get("SERVER_URL", "https://app-2-xqw7.onrender.com")
+REQUEST_TIMEOUT = 60
+JOB_POLL_INTERVAL = 1.0
+# Скільки чекати завершення фонової задачі, перш ніж показати помилку
+JOB_MAX_WAIT = float(os.environ.get("JOB_MAX_WAIT", "600"))
 
 st.set_page_config(page_title="Глобальний пошук у таблицях", layout="wide")
 st.title(" Завантаження та глобальний пошук у таблицях")
@@ -29,26 +35,87 @@ uploaded_files = st.file_uploader(
 )
 
 
+def job_progress_fraction(status):
+    parts = []
+    for file_info in status["files"]:
+        progress = file_info["progress"]
+        if file_info["status"] in ("done", "failed"):
+            parts.append(1.0)
+        elif progress["total"]:
+            parts.append(min(progress["done"] / progress["total"], 1.0))
+        else:
+            parts.append(0.0)
+    return sum(parts) / len(parts) if parts else 0.0
+
+
+def wait_for_job(job_id):
+    # Сервер обробляє файли у фоні, тут лише опитуємо стан задачі; None — задача не завершилась за JOB_MAX_WAIT
+    progress_bar = st.progress(0.0, text="Файли в черзі на обробку...")
+    deadline = time.monotonic() + JOB_MAX_WAIT
+    while time.monotonic() < deadline:
+        status = requests.get(f"{SERVER_URL}/jobs/{job_id}", timeout=REQUEST_TIMEOUT).json()
+        running = [f"{f['filename']}: {f['progress']['done']}/{f['progress']['total']} {f['progress']['unit']}"
+                   for f in status["files"] if f["status"] == "running"]
+        progress_bar.progress(job_progress_fraction(status), text="; ".join(running) or "Обробка файлів...")
+        if status["status"] in ("done", "failed"):
+            progress_bar.empty()
+            return status
+        time.sleep(JOB_POLL_INTERVAL)
+    progress_bar.empty()
+    return None
+
+
+def apply_supplier_delta(table, delta):
+    # Таблиця постачальника зберігає колонку _key; з сервера приходять лише додані, змінені й вилучені рядки
+    changed = pd.DataFrame(delta["changed"])
+    added = pd.DataFrame(delta["added"])
+    if delta["reset"] or table is None:
+        return added
+    drop_keys = {row["_key"] for row in delta["removed"]} | set(changed.get("_key", []))
+    kept = table[~table["_key"].isin(drop_keys)]
+    return pd.concat([frame for frame in (kept, changed, added) if not frame.empty], ignore_index=True)
+
+
 if "tables" not in st.session_state:
     st.session_state.tables = {}
+if "supplier_versions" not in st.session_state:
+    st.session_state.supplier_versions = {}
 if "last_uploaded_filenames" not in st.session_state:
     st.session_state.last_uploaded_filenames = []
 
+all_excel_sheets = st.checkbox("Обробляти всі аркуші Excel (результати «файл#аркуш»)", value=False)
+
 if uploaded_files:
     current_filenames = sorted([f.name for f in uploaded_files])
     if st.button(" Надіслати файли на сервер", key="upload_button"):
             with st.spinner("Обробка файлів..."):
                 files_for_request = [("files", (f.name, f.getvalue(), f.type)) for f in uploaded_files]
                 try:
-                    response = requests.post("https://app-2-xqw7.onrender.com/upload", files=files_for_request)
+                    response = requests.post(f"{SERVER_URL}/jobs", files=files_for_request, timeout=REQUEST_TIMEOUT,
+                                             params={"sheets": "all"} if all_excel_sheets else None)
+                    if response.status_code == 202:
+                        job_id = response.json()["id"]
+                        if wait_for_job(job_id) is None:
+                            response = None
+                        else:
+                            response = requests.get(f"{SERVER_URL}/jobs/{job_id}/results", timeout=REQUEST_TIMEOUT,
+                                                    headers={"Accept": f"{ARROW_STREAM_MIMETYPE}, application/json;q=0.5"})
                     
-                    if response.status_code == 200:
-                        results = response.json()
+                    if response is None:
+                        st.error(f" Обробка не завершилась за {JOB_MAX_WAIT:g} с. Спробуйте надіслати файли ще раз: "
+                                 f"сервер продовжує роботу, і вже оброблені файли повернуться з кешу.")
+                    elif response.status_code == 200:
+                        content_type = response.headers.get("Content-Type", "")
+                        if content_type.startswith(ARROW_STREAM_MIMETYPE):
+                            frames, errors = read_upload_response(response.content, content_type)
+                            results = {**frames, **{name: [{"error": error}] for name, error in errors.items()}}
+                        else:
+                            results = response.json()
                         st.session_state.tables.clear() 
                         processed_files_count = 0
                         for filename, data_or_error in results.items():
-                            if isinstance(data_or_error, list) and data_or_error and isinstance(data_or_error[0], dict) and "error" not in data_or_error[0]:
-                                df = pd.DataFrame(data_or_error)
+                            if isinstance(data_or_error, pd.DataFrame) or (isinstance(data_or_error, list) and data_or_error and isinstance(data_or_error[0], dict) and "error" not in data_or_error[0]):
+                                df = data_or_error if isinstance(data_or_error, pd.DataFrame) else pd.DataFrame(data_or_error)
                                 if not df.empty:
                                     st.session_state.tables[filename] = df
                                     processed_files_count +=1
@@ -72,6 +139,30 @@ if uploaded_files:
     elif not st.session_state.tables and not uploaded_files:
          st.session_state.last_uploaded_filenames = []
 
+with st.expander("Оновлення прайсу постачальника (лише зміни)", expanded=False):
+    supplier_name = st.text_input("Назва постачальника:", placeholder="Наприклад: Cave Dupont")
+    supplier_file = st.file_uploader("Новий прайс постачальника", type=["xlsx", "csv", "pdf"], key="supplier_file")
+    if st.button(" Оновити прайс", key="supplier_delta_button") and supplier_name.strip() and supplier_file:
+        name = supplier_name.strip()
+        known_version = st.session_state.supplier_versions.get(name) if name in st.session_state.tables else None
+        try:
+            response = requests.post(
+                f"{SERVER_URL}/suppliers/{name}/delta", timeout=REQUEST_TIMEOUT,
+                files=[("files", (supplier_file.name, supplier_file.getvalue(), supplier_file.type))],
+                params={"since": known_version} if known_version else None,
+            )
+            if response.status_code == 200:
+                delta = response.json()
+                st.session_state.tables[name] = apply_supplier_delta(st.session_state.tables.get(name), delta)
+                st.session_state.supplier_versions[name] = delta["version"]
+                counts = delta["counts"]
+                st.success(f"Версія {delta['version']}: додано {counts['added']}, змінено {counts['changed']}, "
+                           f"вилучено {counts['removed']} рядків.")
+            else:
+                st.error(f" Сервер повернув код {response.status_code}: {response.text}")
+        except requests.exceptions.ConnectionError:
+            st.error(" Не вдалося підключитись до сервера. Переконайтеся, що Flask app (`app.py`) запущено.")
+
 if st.session_state.tables:
     st.markdown("---")
     st.subheader("Завантажені та оброблені таблиці:")
@@ -108,36 +199,36 @@ selected_categories = st.multiselect(
     help="Пошук буде виконано в колонках, що відповідають обраним категоріям (напр., 'wine_name', 'region')."
 )
 
+search_whole_catalogue = st.checkbox(
+    "Шукати в усьому каталозі на сервері (усі раніше завантажені прайси)",
+    value=False
+)
+
 if st.button(" Шукати", key="global_search_button"):
-    if search_term and st.session_state.tables:
+    if search_term and (st.session_state.tables or search_whole_catalogue):
         all_matches_dfs = []
-        search_term_lower = search_term.strip().lower()
-        
         categories_to_search = selected_categories if selected_categories else searchable_column_categories
 
         if not categories_to_search: 
             st.warning("Немає доступних категорій для пошуку.")
         else:
-            for filename, df in st.session_state.tables.items():
-                row_mask = pd.Series([False] * len(df), index=df.index)
-
-                for original_col_name in df.columns:
-                    base_normalized_name = re.sub(r'_\d+$', '', original_col_name)
-                    
-                    if base_normalized_name in categories_to_search:
-                        try:
-                            col_as_str = df[original_col_name].astype(str).str.lower()
-                            match_in_col = col_as_str.str.contains(re.escape(search_term_lower), na=False)
-                            row_mask = row_mask | match_in_col 
-                        except Exception as e:
-                            st.warning(f"Помилка пошуку в колонці '{original_col_name}' файлу '{filename}': {e}")
-                
-                current_file_matches = df[row_mask]
-
-                if not current_file_matches.empty:
-                    matches_with_filename = current_file_matches.copy()
-                    matches_with_filename.insert(0, " Джерело файлу", filename) 
-                    all_matches_dfs.append(matches_with_filename)
+            params = {"q": search_term.strip(), "columns": ",".join(categories_to_search)}
+            if not search_whole_catalogue:
+                params["file"] = list(st.session_state.tables.keys())
+            try:
+                response = requests.get(f"{SERVER_URL}/search", params=params, timeout=30)
+                if response.status_code == 200:
+                    found = response.json()
+                    if found["results"]:
+                        matches_df = pd.DataFrame(found["results"]).rename(columns={"file": " Джерело файлу"})
+                        for _, file_matches in matches_df.groupby(" Джерело файлу", sort=False):
+                            all_matches_dfs.append(file_matches)
+                        if found["total"] > len(found["results"]):
+                            st.info(f"Показано перші {len(found['results'])} з {found['total']} збігів.")
+                else:
+                    st.error(f" Сервер повернув код {response.status_code}: {response.text}")
+            except requests.exceptions.ConnectionError:
+                st.error(" Не вдалося підключитись до сервера. Переконайтеся, що Flask app (`app.py`) запущено.")
 
             if all_matches_dfs:
                 final_result_df = pd.concat(all_matches_dfs, ignore_index=True)
@@ -159,5 +250,40 @@ if st.button(" Шукати", key="global_search_button"):
     elif not search_term:
         st.warning("Будь ласка, введіть ключове слово для пошуку.")
     elif not st.session_state.tables:
-        st.warning("Будь ласка, спочатку завантажте та обробіть файли.")
+        st.warning("Будь ласка, спочатку завантажте та обробіть файли або увімкніть пошук у всьому каталозі.")
+
 
+st.markdown("## Однакові вина в різних постачальників")
+
+match_term = st.text_input(
+    "Назва вина або виробник (необов'язково):",
+    placeholder="Наприклад: Margaux",
+    key="match_term"
+)
+match_min_suppliers = st.number_input("Мінімум постачальників:", min_value=1, value=2, step=1)
+
+if st.button(" Згрупувати", key="match_button"):
+    params = {"min_suppliers": int(match_min_suppliers), "limit": 1000}
+    if match_term.strip():
+        params["q"] = match_term.strip()
+    try:
+        response = requests.get(f"{SERVER_URL}/matches", params=params, timeout=120)
+        if response.status_code == 200:
+            found = response.json()
+            if found.get("updating"):
+                st.info(" Каталог щойно змінився, групування оновлюється у фоні — за хвилину результат буде повним.")
+            if found["clusters"]:
+                clusters_df = pd.DataFrame(found["clusters"]).drop(columns=["cluster"])
+                clusters_df["files"] = clusters_df["files"].map(", ".join)
+                st.success(f" Знайдено {found['total']} вин, що пропонують кілька постачальників"
+                           + (f" (показано перші {len(clusters_df)})." if found["total"] > len(clusters_df) else "."))
+                st.dataframe(clusters_df.rename(columns={
+                    "offers": "Пропозицій", "suppliers": "Постачальників",
+                    "min_price": "Мін. ціна", "max_price": "Макс. ціна", "files": " Джерела",
+                }), use_container_width=True, height=500)
+            else:
+                st.info(" Однакових вин у різних прайсах не знайдено.")
+        else:
+            st.error(f" Сервер повернув код {response.status_code}: {response.text}")
+    except requests.exceptions.ConnectionError:
+        st.error(" Не вдалося підключитись до сервера. Переконайтеся, що Flask app (`app.py`) запущено.")
@@ -0,0 +1,88 @@
+import io
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from compact import wire_series
+
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+FILE_COLUMN = "file"
+
+
+def frame_to_arrow(df):
+    # Числові колонки лишаються числовими (NaN → null), решта — рядки; змішані object-колонки Arrow не приймає
+    columns = {}
+    for col in df.columns:
+        series = wire_series(df[col])
+        if not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)):
+            series = series.astype("string")
+        columns[str(col)] = pa.Array.from_pandas(series)
+    return pa.table(columns) if columns else pa.table({})
+
+
+def frames_to_arrow_table(frames, errors):
+    # Один Arrow-потік на весь запит: рядки всіх файлів із колонкою "file", відсутні колонки — null
+    tables = []
+    for filename, df in frames.items():
+        table = frame_to_arrow(df)
+        file_column = pa.DictionaryArray.from_arrays(
+            pa.array([0] * table.num_rows, type=pa.int32()), pa.array([filename]))
+        tables.append(table.add_column(0, FILE_COLUMN, file_column))
+
+    if tables:
+        try:
+            table = pa.concat_tables(tables, promote_options="permissive")
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Та сама колонка числова в одному файлі й текстова в іншому — зводимо до рядків
+            tables = [t.cast(pa.schema([f if f.name == FILE_COLUMN else pa.field(f.name, pa.string())
+                                        for f in t.schema])) for t in tables]
+            table = pa.concat_tables(tables, promote_options="default")
+    else:
+        table = pa.table({FILE_COLUMN: pa.array([], type=pa.dictionary(pa.int32(), pa.string()))})
+
+    return table.replace_schema_metadata({
+        b"files": json.dumps(list(frames) + list(errors), ensure_ascii=False).encode(),
+        b"errors": json.dumps(errors, ensure_ascii=False).encode(),
+    })
+
+
+def arrow_ipc_bytes(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def parquet_bytes(table):
+    sink = io.BytesIO()
+    pq.write_table(table, sink)
+    return sink.getvalue()
+
+
+def read_upload_response(payload, content_type):
+    # Клієнтська частина: {файл: DataFrame} та {файл: помилка}
+    if content_type.startswith(PARQUET_MIMETYPE):
+        table = pq.read_table(pa.BufferReader(payload))
+    else:
+        table = pa.ipc.open_stream(payload).read_all()
+    table = table.unify_dictionaries()
+    metadata = table.schema.metadata or {}
+    errors = json.loads(metadata.get(b"errors", b"{}"))
+
+    frames = {}
+    if table.num_rows:
+        file_column = table.column(FILE_COLUMN).combine_chunks()
+        for file_id, filename in enumerate(file_column.dictionary.to_pylist()):
+            file_table = table.filter(pc.equal(file_column.indices, file_id)).drop_columns([FILE_COLUMN])
+            # Колонки, що прийшли лише з інших файлів, повністю порожні
+            keep = [name for name in file_table.column_names if file_table.column(name).null_count < file_table.num_rows]
+            # ArrowDtype лишає дані в буферах Arrow замість копіювання в Python-об'єкти
+            frames[filename] = file_table.select(keep).to_pandas(types_mapper=pd.ArrowDtype)
+    for filename in json.loads(metadata.get(b"files", b"[]")):
+        if filename not in frames and filename not in errors:
+            frames[filename] = pd.DataFrame()
+    return frames, errors
@@ -0,0 +1,112 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Текстова колонка стає category, якщо різних значень не більше цієї частки рядків
+# (виробник, регіон, країна, колір, формат); майже унікальні назви вин лишаються рядками
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+CATEGORY_SAMPLE_ROWS = 1000
+# Колонки (з суфіксами дублікатів year_2...), що розбираються в nullable цілі, якщо кожне значення — ціле число
+INTEGER_COLUMN_RE = re.compile(r"(year|stock)(_\d+)?")
+INTEGER_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+# Ціни зберігаються у float32, лише якщо після округлення до центів вони збігаються з float64
+PRICE_DECIMALS = 2
+# Точний deep-розмір object-колонок коштує прохід по всіх рядках, тож для звіту по файлу беремо вибірку
+MEMORY_SAMPLE_ROWS = 20000
+
+
+def frame_memory(df, sample_rows=None):
+    if sample_rows is None or len(df) <= sample_rows:
+        return int(df.memory_usage(deep=True, index=False).sum())
+    step = len(df) // sample_rows
+    return int(df.iloc[::step].memory_usage(deep=True, index=False).sum() * len(df) / len(range(0, len(df), step)))
+
+
+def widen_float32(series):
+    # float32 → float64 з округленням до центів, щоб у JSON, хешах і каталозі було 12.99, а не 12.989999771118164
+    if series.dtype != np.float32:
+        return series
+    return pd.Series(np.round(series.to_numpy(dtype=np.float64), PRICE_DECIMALS), index=series.index, name=series.name)
+
+
+def is_text_integer(series):
+    # Nullable Int* ставить лише to_small_integer для рік/залишку, що у файлі були текстом
+    return pd.api.types.is_extension_array_dtype(series) and pd.api.types.is_integer_dtype(series)
+
+
+def wire_series(series):
+    # Типи відповіді такі ж, як без стиснення: рік і залишок — рядки, ціни — float64 до центів
+    if is_text_integer(series):
+        codes, uniques = pd.factorize(series)
+        texts = np.array([str(value) for value in uniques] + [None], dtype=object)
+        return pd.Series(texts[codes], index=series.index, name=series.name)
+    return widen_float32(series)
+
+
+def wire_frame(df):
+    columns = [col for col, dtype in df.dtypes.items() if dtype == np.float32 or is_text_integer(df[col])]
+    if not columns:
+        return df
+    return df.assign(**{col: wire_series(df[col]) for col in columns})
+
+
+def to_category(series):
+    # Майже унікальні колонки (назви вин) відсікаються за вибіркою, без factorize усієї колонки
+    sample = series.iloc[:CATEGORY_SAMPLE_ROWS]
+    if sample.nunique() > len(sample) * CATEGORY_MAX_UNIQUE_RATIO:
+        return None
+    codes, uniques = pd.factorize(series)
+    # Змішані числа й рядки (з Excel) лишаються як є: category з різнотипними значеннями не пишеться в Parquet
+    if len(uniques) > len(series) * CATEGORY_MAX_UNIQUE_RATIO or pd.api.types.infer_dtype(uniques) != "string":
+        return None
+    return pd.Series(pd.Categorical.from_codes(codes, uniques), index=series.index, name=series.name)
+
+
+def to_small_integer(series):
+    # Кожне унікальне значення розбирається один раз; будь-яке нечислове чи дробове значення ("NV", "12.5") —
+    # і колонка лишається текстовою, щоб не втратити дані.
+    # Лише текст ("2015" з CSV/PDF): nullable Int*, що у відповідях і хешах знову стає рядком (wire_series).
+    # Object-колонки з числами Excel лишаються як є — їх JSON-тип і хеш мають бути числовими, як і раніше
+    codes, uniques = pd.factorize(series)
+    if pd.api.types.infer_dtype(uniques) != "string":
+        return None
+    texts = pd.Series(uniques, dtype=object)
+    parsed = pd.to_numeric(texts, errors="coerce").to_numpy(dtype=float)
+    if np.isnan(parsed).any() or (parsed % 1).any():
+        return None
+    # Текст має відновлюватися з числа дослівно: "2015.0", " 1999" чи "007" лишають колонку текстовою
+    if (texts.to_numpy() != pd.Series(parsed.astype(np.int64)).astype(str).to_numpy()).any():
+        return None
+    low, high = (parsed.min(), parsed.max()) if len(parsed) else (0, 0)
+    dtype = next(dtype for dtype in INTEGER_DTYPES if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max)
+    values = np.append(parsed.astype(dtype), dtype(0))[codes]
+    return pd.Series(pd.arrays.IntegerArray(values, codes < 0), index=series.index, name=series.name)
+
+
+def to_float32(series):
+    values = series.to_numpy(dtype=np.float64)
+    narrowed = values.astype(np.float32)
+    restored = np.round(narrowed.astype(np.float64), PRICE_DECIMALS)
+    if not np.array_equal(restored, values, equal_nan=True):
+        return None
+    return pd.Series(narrowed, index=series.index, name=series.name)
+
+
+def compact_frame(df):
+    # Повертає (фрейм, {колонка: новий dtype}); колонки, які не вдається стиснути без втрат, не змінюються
+    changes = {}
+    for position, col in enumerate(df.columns):
+        series = df.iloc[:, position]
+        if series.dtype == object:
+            converted = to_small_integer(series) if INTEGER_COLUMN_RE.fullmatch(str(col)) else None
+            if converted is None:
+                converted = to_category(series)
+        elif series.dtype == np.float64:
+            converted = to_float32(series)
+        else:
+            continue
+        if converted is not None:
+            df.isetitem(position, converted)
+            changes[col] = str(converted.dtype)
+    return df, changes
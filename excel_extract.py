@@ -0,0 +1,189 @@
+import importlib.util
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from pdf_extract import terminate_pool_processes, wait_result
+
+# python-calamine (Rust) необов'язковий: якщо встановлений, pandas читає ним у рази швидше за openpyxl
+HAS_CALAMINE = importlib.util.find_spec("python_calamine") is not None
+
+EXCEL_WORKERS = int(os.environ.get("EXCEL_WORKERS", str(os.cpu_count() or 1)))
+# Ліміт на читання одного аркуша в пулі; завислий аркуш стає помилкою, а пул перезапускається
+EXCEL_SHEET_TIMEOUT = float(os.environ.get("EXCEL_SHEET_TIMEOUT", "20"))
+
+# Як часто read_sheet повідомляє про прочитані рядки
+PROGRESS_ROWS = 10000
+
+_pool = None
+_pool_lock = threading.Lock()
+# Як і в pdf_extract: процеси пулу не форкаються з багатопотокового воркера gunicorn
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _openpyxl():
+    # openpyxl імпортується з першим Excel-файлом, а не під час старту кожного воркера
+    import openpyxl
+    return openpyxl
+
+
+def read_sheet(source, sheet_name=None, ext=".xlsx", progress=None):
+    # source — шлях або файловий об'єкт; sheet_name=None означає перший аркуш.
+    # progress(рядки, усього, "rows") викликається під час читання openpyxl; calamine читає аркуш одним викликом
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if HAS_CALAMINE:
+        return pd.read_excel(source, header=None, sheet_name=sheet_name or 0, engine="calamine")
+    if ext != ".xlsx":
+        return pd.read_excel(source, header=None, sheet_name=sheet_name or 0)
+
+    # read_only + values_only: рядки без DOM книги та без об'єктів Cell
+    workbook = _openpyxl().load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        if not progress:
+            return pd.DataFrame(list(sheet.iter_rows(values_only=True)))
+        rows = []
+        for row in sheet.iter_rows(values_only=True):
+            rows.append(row)
+            if len(rows) % PROGRESS_ROWS == 0:
+                progress(len(rows), max(sheet.max_row or 0, len(rows)), "rows")
+        return pd.DataFrame(rows)
+    finally:
+        workbook.close()
+
+
+def iter_sheet_chunks(file, chunksize, sheet_name=None):
+    file.seek(0)
+    workbook = _openpyxl().load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        buffer, offset = [], 0
+        for row in sheet.iter_rows(values_only=True):
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, index=range(offset, offset + len(buffer)))
+                offset += len(buffer)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, index=range(offset, offset + len(buffer)))
+    finally:
+        workbook.close()
+
+
+def sheet_names(file, ext=".xlsx"):
+    file.seek(0)
+    if ext == ".xlsx":
+        workbook = _openpyxl().load_workbook(file, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    return list(pd.ExcelFile(file, engine="calamine" if HAS_CALAMINE else None).sheet_names)
+
+
+def _read_sheet_task(path, sheet_name, ext):
+    return sheet_name, read_sheet(path, sheet_name, ext)
+
+
+def _pool_ready():
+    return os.getpid()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ProcessPoolExecutor(max_workers=max(1, EXCEL_WORKERS),
+                                       mp_context=multiprocessing.get_context(POOL_START_METHOD))
+            # Старт процесів з імпортом pandas — до першого аркуша, щоб не зараховуватись у EXCEL_SHEET_TIMEOUT
+            for future in [pool.submit(_pool_ready) for _ in range(max(1, EXCEL_WORKERS))]:
+                future.result()
+            _pool = pool
+        return _pool
+
+
+def shutdown_pool():
+    # Для коротких процесів (бенчмарки, скрипти): без цього процеси пулу не дають інтерпретатору завершитись
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            terminate_pool_processes(_pool)
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def read_sheets(file, filename, sheets, ext=".xlsx", workers=None, sheet_timeout=None, cancelled=None):
+    # {аркуш: сирий DataFrame або Exception}; кілька аркушів читаються паралельно в пулі процесів.
+    # cancelled — threading.Event запиту: після нього читання зупиняється з CancelledError
+    workers = EXCEL_WORKERS if workers is None else workers
+    sheet_timeout = EXCEL_SHEET_TIMEOUT if sheet_timeout is None else sheet_timeout
+    if len(sheets) <= 1 or workers <= 1:
+        results = {}
+        for sheet_name in sheets:
+            if cancelled is not None and cancelled.is_set():
+                raise CancelledError()
+            try:
+                results[sheet_name] = read_sheet(file, sheet_name, ext)
+            except Exception as e:
+                results[sheet_name] = e
+        return results
+
+    file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+        while True:
+            chunk = file.read(1024 * 1024)
+            if not chunk:
+                break
+            tmp.write(chunk)
+        tmp_path = tmp.name
+
+    try:
+        logging.info(f"{filename}: Reading {len(sheets)} sheets on {workers} processes.")
+        results, pending = {}, list(sheets)
+        while pending:
+            pool = _get_pool()
+            futures = {sheet_name: pool.submit(_read_sheet_task, tmp_path, sheet_name, ext) for sheet_name in pending}
+            pending, was_reset = [], False
+            for sheet_name, future in futures.items():
+                if was_reset:
+                    # Пул перезапущено через інший аркуш: готовий результат беремо, решту читаємо в новому пулі
+                    if future.done() and not future.cancelled() and not isinstance(future.exception(), BrokenProcessPool):
+                        error = future.exception()
+                        results[sheet_name] = error if error is not None else future.result()[1]
+                    else:
+                        pending.append(sheet_name)
+                    continue
+                try:
+                    results[sheet_name] = wait_result(future, sheet_timeout or None, cancelled)[1]
+                except CancelledError:
+                    for other in futures.values():
+                        other.cancel()
+                    raise
+                except BrokenProcessPool:
+                    _reset_pool()
+                    raise
+                except FuturesTimeoutError:
+                    logging.warning(f"{filename}: Sheet {sheet_name} exceeded {sheet_timeout}s, pool reset.")
+                    _reset_pool()
+                    was_reset = True
+                    results[sheet_name] = TimeoutError(f"перевищено час читання ({sheet_timeout:g} с)")
+                except Exception as e:
+                    results[sheet_name] = e
+        return results
+    finally:
+        os.remove(tmp_path)
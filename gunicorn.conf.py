@@ -0,0 +1,39 @@
+# Конфігурація gunicorn: gunicorn -c gunicorn.conf.py app:app (див. Procfile).
+# Адреса й кількість воркерів — зі стандартних змінних PORT і WEB_CONCURRENCY.
+import gc
+import os
+import resource
+import time
+
+# app.py імпортується один раз у майстрі: pandas/pyarrow, скомпільовані шаблони колонок і індекс каталогу
+# воркери отримують через fork (copy-on-write), а не імпортують і будують кожен сам
+preload_app = True
+
+_master_started = time.perf_counter()
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def when_ready(server):
+    # Усе, що створено в майстрі, — у постійне покоління GC: збирач сміття у воркерах не оновлює
+    # заголовки цих об'єктів і не розщеплює спільні сторінки пам'яті
+    gc.freeze()
+    server.log.info(f"Master ready in {time.perf_counter() - _master_started:.2f}s, RSS {rss_mb():.0f} MB "
+                    f"({gc.get_freeze_count()} objects frozen)")
+
+
+def post_worker_init(worker):
+    # Потоки черги задач — одразу в кожному новому воркері: queued і завислі running після перезапуску
+    # беруться в роботу, не чекаючи наступного POST /jobs
+    import app
+    app.job_queue.start()
+    worker.log.info(f"Worker {os.getpid()} ready, RSS {rss_mb():.0f} MB")
@@ -0,0 +1,227 @@
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+import pyarrow.parquet as pq
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import secure_filename
+
+from columnar import frame_to_arrow
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    args TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER NOT NULL DEFAULT 0,
+    progress_unit TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    result_path TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS job_files_status ON job_files (status, updated_at);
+"""
+
+
+class JobQueue:
+    def __init__(self, jobs_dir, run_file, workers=2, stale_seconds=600, retention_hours=24, poll_interval=0.5):
+        # run_file(file, filename, args, progress) -> DataFrame або [{"error": ...}]
+        self.jobs_dir = jobs_dir
+        self.run_file = run_file
+        self.workers = workers
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_hours * 3600
+        self.poll_interval = poll_interval
+        self.db_path = os.path.join(jobs_dir, "jobs.db")
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        os.makedirs(jobs_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        # Потоки запускаються ліниво в кожному воркері gunicorn, а не до fork
+        with self._start_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, file_storages, args):
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir)
+        now = time.time()
+        rows = []
+        for position, file_storage in enumerate(file_storages):
+            path = os.path.join(job_dir, f"{position}_{secure_filename(file_storage.filename) or 'upload'}")
+            file_storage.save(path)
+            rows.append((job_id, position, file_storage.filename, path, "queued", now))
+        with self._connect() as conn:
+            conn.execute("INSERT INTO jobs (id, args, created_at) VALUES (?, ?, ?)",
+                         (job_id, json.dumps(list(args.items(multi=True))), now))
+            conn.executemany("INSERT INTO job_files (job_id, position, filename, path, status, updated_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        logging.info(f"Job {job_id}: queued {len(rows)} file(s).")
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def _claim(self):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Файли, що "зависли" в running після перезапуску воркера, беремо повторно
+            row = conn.execute(
+                "SELECT job_id, position FROM job_files WHERE status = 'queued' "
+                "OR (status = 'running' AND updated_at < ?) ORDER BY updated_at LIMIT 1",
+                (now - self.stale_seconds,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE job_files SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                         "WHERE job_id = ? AND position = ?", (now, row["job_id"], row["position"]))
+            return conn.execute(
+                "SELECT f.*, j.args FROM job_files f JOIN jobs j ON j.id = f.job_id "
+                "WHERE f.job_id = ? AND f.position = ?", (row["job_id"], row["position"])).fetchone()
+
+    def _update(self, job_id, position, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE job_files SET {assignments} WHERE job_id = ? AND position = ?",
+                         (*fields.values(), job_id, position))
+
+    def _worker_loop(self):
+        last_cleanup = 0
+        while True:
+            try:
+                if time.time() - last_cleanup > 3600:
+                    self.cleanup()
+                    last_cleanup = time.time()
+                task = self._claim()
+            except Exception as e:
+                logging.error(f"Job worker: could not claim a task: {e}")
+                task = None
+            if task is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run_task(task)
+
+    def _run_task(self, task):
+        job_id, position, filename = task["job_id"], task["position"], task["filename"]
+
+        def progress(done, total, unit):
+            self._update(job_id, position, progress_done=done, progress_total=total, progress_unit=unit)
+
+        try:
+            args = MultiDict(json.loads(task["args"]))
+            with open(task["path"], "rb") as fh:
+                result = self.run_file(fh, filename, args, progress)
+            if isinstance(result, list):
+                self._update(job_id, position, status="failed", error=result[0].get("error", str(result[0])))
+                return
+            # result_path — JSON {мітка: шлях або помилка}; книга з ?sheets=all дає кілька міток
+            outputs = result if isinstance(result, dict) else {filename: result}
+            result_paths = {}
+            for i, (label, frame) in enumerate(outputs.items()):
+                if isinstance(frame, list):
+                    result_paths[label] = {"error": frame[0].get("error", str(frame[0]))}
+                    continue
+                path = f"{task['path']}.{i}.result.parquet"
+                pq.write_table(frame_to_arrow(frame), path)
+                result_paths[label] = {"path": path}
+            self._update(job_id, position, status="done", result_path=json.dumps(result_paths))
+            logging.info(f"Job {job_id}: {filename} done, {len(outputs)} result(s).")
+        except Exception as e:
+            logging.error(f"Job {job_id}: {filename} failed: {e}\n{traceback.format_exc()}")
+            self._update(job_id, position, status="failed", error=f"{filename}: КРИТИЧНА ПОМИЛКА ОБРОБКИ - {e}")
+
+    def status(self, job_id):
+        # Опитування стану теж запускає потоки: після перезапуску воркера його задачі підхоплюються без нового POST
+        self.start()
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = conn.execute("SELECT * FROM job_files WHERE job_id = ? ORDER BY position", (job_id,)).fetchall()
+        statuses = {f["status"] for f in files}
+        if statuses <= {"done", "failed"}:
+            job_status = "failed" if statuses == {"failed"} else "done"
+        else:
+            job_status = "running" if statuses & {"running", "done", "failed"} else "queued"
+        return {
+            "id": job_id,
+            "status": job_status,
+            "created_at": job["created_at"],
+            "files": [{
+                "filename": f["filename"],
+                "status": f["status"],
+                "attempts": f["attempts"],
+                "progress": {"done": f["progress_done"], "total": f["progress_total"], "unit": f["progress_unit"]},
+                "error": f["error"],
+            } for f in files],
+        }
+
+    def result_frames(self, job_id):
+        with self._connect() as conn:
+            files = conn.execute("SELECT filename, status, error, result_path FROM job_files "
+                                 "WHERE job_id = ? ORDER BY position", (job_id,)).fetchall()
+        # Словник у порядку файлів: DataFrame або текст помилки
+        results = {}
+        for f in files:
+            if f["status"] == "done":
+                for label, output in json.loads(f["result_path"]).items():
+                    results[label] = pq.read_table(output["path"]).to_pandas() if "path" in output else output["error"]
+            elif f["status"] == "failed":
+                results[f["filename"]] = f["error"]
+        return results
+
+    def retry(self, job_id):
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE job_files SET status = 'queued', error = NULL, progress_done = 0, "
+                                  "updated_at = ? WHERE job_id = ? AND status = 'failed'", (time.time(), job_id))
+        if cursor.rowcount:
+            self.start()
+            self._wakeup.set()
+        return cursor.rowcount
+
+    def cleanup(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._connect() as conn:
+            old_jobs = [row["id"] for row in conn.execute("SELECT id FROM jobs WHERE created_at < ?", (cutoff,))]
+            for job_id in old_jobs:
+                conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        for job_id in old_jobs:
+            shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
@@ -0,0 +1,190 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+MATCH_COLUMNS = ["wine_name", "producer", "year", "bottle_size"]
+# Службові слова в назвах виробників: "Ch. Margaux" і "Chateau Margaux" мають дати один ключ
+PRODUCER_STOPWORDS = {
+    "chateau", "ch", "domaine", "dom", "dne", "weingut", "wg", "bodegas", "bodega", "cave", "caves", "maison",
+    "tenuta", "cantina", "clos", "de", "du", "des", "la", "le", "les", "et", "di", "del", "della", "von",
+    "sa", "sas", "sarl", "gmbh", "srl",
+}
+NAME_SIMILARITY_THRESHOLD = 0.6
+# Блоки з більшою кількістю різних назв зіставляються лише за точним ключем назви
+MAX_BLOCK_NAMES = 500
+VINTAGE_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+# Після normalize_text кома й крапка стають пробілом: "0,75 L" → "0 75 l"
+SIZE_RE = re.compile(r"\b(?P<number>\d+(?: \d+)?) ?(?P<unit>ml|cl|ltr|litre|liter|l)?\b")
+SIZE_UNIT_CL = {"ml": 0.1, "cl": 1.0, "l": 100.0, "ltr": 100.0, "litre": 100.0, "liter": 100.0}
+
+
+def normalize_text(values):
+    # Нижній регістр без діакритики й пунктуації: "Château-Grillet" → "chateau grillet"
+    array = pa.array(pd.Series(values, dtype=object).astype(str), type=pa.string())
+    array = pc.replace_substring_regex(pc.utf8_normalize(array, "NFKD"), r"\p{Mn}", "")
+    array = pc.replace_substring_regex(pc.utf8_lower(array), r"[^a-z0-9]+", " ")
+    return pc.utf8_trim_whitespace(array).to_pylist()
+
+
+def map_unique(values, func):
+    # Обчислення по унікальних значеннях з розкладанням назад по рядках; порожні клітинки → ""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    mapped = np.array([func(value) for value in uniques] + [""], dtype=object)
+    return mapped[codes]
+
+
+def normalized_keys(series, func):
+    codes, uniques = pd.factorize(series.astype(object))
+    mapped = np.array([func(text) for text in normalize_text(uniques)] + [""], dtype=object)
+    return mapped[codes]
+
+
+def token_set_key(text, stopwords=()):
+    # Порядок слів не важливий: "Margaux Pavillon Rouge" і "Pavillon Rouge Margaux" — одна назва
+    return " ".join(sorted({token for token in text.split() if token not in stopwords}))
+
+
+def producer_key(text):
+    return token_set_key(text, PRODUCER_STOPWORDS)
+
+
+def vintage_key(text):
+    found = VINTAGE_RE.search(text)
+    return found.group(0) if found else "nv"
+
+
+def size_key(text):
+    # Формат пляшки в сантилітрах: "75cl", "0 75 l", "750 ml" і просто "75" → "75"
+    found = SIZE_RE.search(text)
+    if not found:
+        return text
+    number = float(found.group("number").replace(" ", "."))
+    unit = found.group("unit") or ("l" if number < 10 else "ml" if number >= 200 else "cl")
+    return f"{number * SIZE_UNIT_CL[unit]:g}"
+
+
+def name_key(name_and_producer):
+    # Назва без службових слів і без слів з назви виробника: "Pavillon Rouge du Ch. Margaux" → "pavillon rouge";
+    # якщо назва — це лише виробник ("Chateau Margaux" від Château Margaux), лишаємо її без службових слів
+    name, producer = name_and_producer.split("|")
+    return token_set_key(name, PRODUCER_STOPWORDS | set(producer.split())) or token_set_key(name, PRODUCER_STOPWORDS)
+
+
+def digits_key(text):
+    # Слова з цифрами ("No 1" проти "No 2", "1er") мають збігатися точно — тримаємо їх у ключі блоку.
+    # Рік у назві не враховуємо: він і так є в ключі блоку через колонку year
+    return " ".join(token for token in text.split()
+                    if any(ch.isdigit() for ch in token) and not VINTAGE_RE.fullmatch(token))
+
+
+def trigram_postings(names):
+    # Пари (номер назви, код триграми) векторизовано по UTF-8 буферу Arrow, без циклу по рядках
+    padded = pc.cast(pc.binary_join_element_wise(" ", pa.array(names, type=pa.string()), " ", ""), pa.large_string())
+    offsets = np.frombuffer(padded.buffers()[1], dtype=np.int64)[padded.offset:padded.offset + len(padded) + 1]
+    data = np.frombuffer(padded.buffers()[2], dtype=np.uint8)
+    lengths = np.diff(offsets)
+    counts = np.maximum(lengths - 2, 0)
+    owners = np.repeat(np.arange(len(names)), counts)
+    first = np.repeat(offsets[:-1] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    positions = first + np.arange(counts.sum())
+    codes = (data[positions].astype(np.int64) << 16) | (data[positions + 1].astype(np.int64) << 8) | data[positions + 2]
+    pairs = np.unique(owners.astype(np.int64) << 24 | codes)
+    return pairs >> 24, pairs & 0xFFFFFF
+
+
+def connected_components(count, left, right):
+    # Мітка компоненти — найменший номер вершини; поширюємо мінімум по ребрах до стабілізації
+    labels = np.arange(count)
+    while len(left):
+        merged = np.minimum(labels[left], labels[right])
+        before = labels.copy()
+        np.minimum.at(labels, left, merged)
+        np.minimum.at(labels, right, merged)
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            break
+    return labels
+
+
+def similar_name_pairs(entities, threshold=NAME_SIMILARITY_THRESHOLD):
+    # Кандидати — лише назви з одного блоку, що мають спільну триграму; схожість — Жаккар по триграмах
+    block_sizes = entities.groupby("block")["name"].transform("size")
+    candidates = entities[(block_sizes > 1) & (block_sizes <= MAX_BLOCK_NAMES) & (entities["producer"] != "")]
+    if candidates.empty:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    owners, grams = trigram_postings(candidates["name"].tolist())
+    postings = pd.DataFrame({
+        "entity": candidates.index.to_numpy()[owners],
+        "block": candidates["block"].to_numpy()[owners],
+        "gram": grams,
+    })
+    gram_counts = postings.groupby("entity").size()
+    joined = postings.merge(postings, on=["block", "gram"], suffixes=("_a", "_b"))
+    joined = joined[joined["entity_a"] < joined["entity_b"]]
+    shared = joined.groupby(["entity_a", "entity_b"]).size()
+    left = shared.index.get_level_values(0).to_numpy()
+    right = shared.index.get_level_values(1).to_numpy()
+    union = gram_counts.loc[left].to_numpy() + gram_counts.loc[right].to_numpy() - shared.to_numpy()
+    similar = shared.to_numpy() / union >= threshold
+    return left[similar], right[similar]
+
+
+def cluster_offers(offers, threshold=NAME_SIMILARITY_THRESHOLD):
+    # offers: фрейм з канонічними колонками (wine_name, producer, year, bottle_size, price[, file, supplier]).
+    # Повертає мітку кластера для кожного рядка
+    if offers.empty:
+        return np.array([], dtype=np.int64)
+
+    def column(name):
+        return offers[name] if name in offers.columns else pd.Series([None] * len(offers), index=offers.index)
+
+    producers = normalized_keys(column("producer"), producer_key)
+    names = map_unique(normalized_keys(column("wine_name"), str) + "|" + producers, name_key)
+    keys = pd.DataFrame({
+        "producer": producers,
+        "vintage": normalized_keys(column("year"), vintage_key),
+        "size": normalized_keys(column("bottle_size"), size_key),
+        "digits": map_unique(names, digits_key),
+        "name": names,
+    })
+    # Сутність — точний збіг усіх ключів; блок — сутності, які взагалі має сенс порівнювати
+    entity_of_row = keys.groupby(list(keys.columns), sort=False).ngroup().to_numpy()
+    entities = keys.groupby(entity_of_row, sort=True).first().reset_index(drop=True)
+    entities["block"] = entities.groupby(["producer", "vintage", "size", "digits"], sort=False).ngroup()
+    left, right = similar_name_pairs(entities, threshold)
+    labels = connected_components(len(entities), left, right)
+    return pd.factorize(labels[entity_of_row])[0]
+
+
+def most_frequent(frame, group, column):
+    counts = frame.groupby([group, column], sort=False).size().reset_index(name="n")
+    return counts.sort_values("n", ascending=False, kind="stable").drop_duplicates(group).set_index(group)[column]
+
+
+def summarize_clusters(offers, labels):
+    # Одна пропозиція на кластер: найчастіше написання, кількість пропозицій і постачальників, мін/макс ціна
+    frame = pd.DataFrame({"cluster": labels}, index=offers.index)
+    for name in MATCH_COLUMNS + ["file"]:
+        frame[name] = offers[name].astype(object) if name in offers.columns else None
+    # Постачальник — не файл: той самий постачальник під різними іменами файлів рахується один раз
+    frame["supplier"] = offers["supplier"].astype(object) if "supplier" in offers.columns else frame["file"]
+    frame["price"] = pd.to_numeric(offers["price"], errors="coerce") if "price" in offers.columns else np.nan
+    grouped = frame.groupby("cluster")
+    clusters = pd.DataFrame({
+        "offers": grouped.size(),
+        "suppliers": grouped["supplier"].nunique(),
+        "min_price": grouped["price"].min(),
+        "max_price": grouped["price"].max(),
+    })
+    for name in MATCH_COLUMNS:
+        clusters[name] = most_frequent(frame.dropna(subset=[name]), "cluster", name)
+    # Списки файлів — одним сортуванням пар (кластер, файл) і розрізанням по межах кластерів, без apply по групах
+    pairs = frame[["cluster", "file"]].dropna().drop_duplicates().sort_values(["cluster", "file"])
+    bounds = np.flatnonzero(np.diff(pairs["cluster"].to_numpy())) + 1
+    files = pd.Series([list(chunk) for chunk in np.split(pairs["file"].to_numpy(), bounds)] if len(pairs) else [],
+                      index=pairs["cluster"].unique(), dtype=object)
+    clusters["files"] = [found if isinstance(found, list) else [] for found in files.reindex(clusters.index)]
+    return clusters.reset_index()[["cluster"] + MATCH_COLUMNS + ["offers", "suppliers", "min_price", "max_price", "files"]]
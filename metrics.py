@@ -0,0 +1,163 @@
+import contextvars
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Етапи конвеєра: decode, sniff, parse, header, normalize, price, compact, catalogue, filter, diff, match, serialize;
+# "total" — увесь файл від початку до відфільтрованого фрейму
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+ROWS_BUCKETS = [10, 100, 1000, 10000, 100000, 1000000]
+BYTES_BUCKETS = [1024, 16 * 1024, 256 * 1024, 4 * 2**20, 64 * 2**20, 1024 * 2**20]
+
+# Скільки найповільніших файлів показувати в /metrics з міткою file
+METRICS_SLOWEST_FILES = int(os.environ.get("METRICS_SLOWEST_FILES", "20"))
+
+# METRICS_TRACEMALLOC=1 вмикає замір піку алокацій по етапах; tracemalloc помітно сповільнює обробку
+if os.environ.get("METRICS_TRACEMALLOC", "").strip() in ("1", "true") and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Збирач спанів поточного запиту (для X-Timing); потоки пулу отримують його через copy_context
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def file_size(file):
+    try:
+        pos = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(pos)
+        return size
+    except Exception:
+        return 0
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + [math.inf], self.counts):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else f"{bound:g}"
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.total:g}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class StageMetrics:
+    def __init__(self, slowest_files=METRICS_SLOWEST_FILES):
+        self.slowest_files = slowest_files
+        self._seconds = {}
+        self._rows = {}
+        self._bytes = {}
+        self._peak = {}
+        self._file_seconds = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, filename="", nbytes=0, rows=0):
+        # Поля rows/bytes можна уточнити всередині блоку: with span(...) as s: s["rows"] = len(df)
+        record = {"stage": stage, "file": filename, "rows": rows, "bytes": nbytes, "peak_bytes": None}
+        # Пік tracemalloc спільний для всіх потоків, тож при паралельних файлах він приблизний
+        tracing = tracemalloc.is_tracing() and stage != "total"
+        if tracing:
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if tracing:
+                record["peak_bytes"] = max(tracemalloc.get_traced_memory()[1] - start_mem, 0)
+            self.record(record)
+
+    def record(self, record):
+        key = (record["stage"], os.path.splitext(record["file"])[1].lower())
+        with self._lock:
+            self._seconds.setdefault(key, Histogram(SECONDS_BUCKETS)).observe(record["seconds"])
+            if record["rows"]:
+                self._rows.setdefault(key, Histogram(ROWS_BUCKETS)).observe(record["rows"])
+            if record["bytes"]:
+                self._bytes.setdefault(key, Histogram(BYTES_BUCKETS)).observe(record["bytes"])
+            if record["peak_bytes"] is not None:
+                self._peak.setdefault(key, Histogram(BYTES_BUCKETS)).observe(record["peak_bytes"])
+            if record["stage"] == "total" and record["file"]:
+                self._remember_file(record["file"], record["seconds"])
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append(record)
+
+    def _remember_file(self, filename, seconds):
+        self._file_seconds[filename] = seconds
+        if len(self._file_seconds) > self.slowest_files:
+            fastest = min(self._file_seconds, key=self._file_seconds.get)
+            del self._file_seconds[fastest]
+
+    def render(self, extra_lines=()):
+        series = [
+            ("ingest_stage_seconds", "Wall time of an ingestion stage", self._seconds),
+            ("ingest_stage_rows", "Rows handled by an ingestion stage", self._rows),
+            ("ingest_stage_bytes", "Input bytes handled by an ingestion stage", self._bytes),
+            ("ingest_stage_peak_alloc_bytes", "Peak traced allocation of an ingestion stage", self._peak),
+        ]
+        lines = []
+        with self._lock:
+            for name, help_text, histograms in series:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (stage, ext), histogram in sorted(histograms.items()):
+                    lines += histogram.lines(name, f'stage="{stage}",ext="{escape_label(ext)}"')
+            lines += ["# HELP ingest_slowest_file_seconds Last total processing time of the slowest recent files",
+                      "# TYPE ingest_slowest_file_seconds gauge"]
+            for filename, seconds in sorted(self._file_seconds.items(), key=lambda item: -item[1]):
+                lines.append(f'ingest_slowest_file_seconds{{file="{escape_label(filename)}"}} {seconds:g}')
+        lines += extra_lines
+        return "\n".join(lines) + "\n"
+
+
+def start_request_spans():
+    return _request_spans.set([])
+
+
+def current_request_spans():
+    return _request_spans.get() or []
+
+
+def finish_request_spans(token):
+    _request_spans.reset(token)
+
+
+def timing_breakdown(spans):
+    # {файл: {етап: {"ms", "rows", "bytes"[, "peak_bytes"]}}}; повторні етапи (аркуші, порції) сумуються
+    breakdown = {}
+    for record in spans:
+        # Спани без файлу (серіалізація Arrow/Parquet-відповіді) стосуються всієї відповіді
+        stages = breakdown.setdefault(record["file"] or "response", {})
+        entry = stages.setdefault(record["stage"], {"ms": 0.0, "rows": 0, "bytes": 0})
+        entry["ms"] = round(entry["ms"] + record["seconds"] * 1000, 2)
+        entry["rows"] += record["rows"]
+        entry["bytes"] += record["bytes"]
+        if record["peak_bytes"] is not None:
+            entry["peak_bytes"] = max(entry.get("peak_bytes", 0), record["peak_bytes"])
+    return breakdown
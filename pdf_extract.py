@@ -0,0 +1,195 @@
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGE_TIMEOUT = float(os.environ.get("PDF_PAGE_TIMEOUT", "20"))
+# Менші PDF дешевше розібрати в поточному процесі, ніж передавати в пул
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "8"))
+# Як часто очікування результату пулу перевіряє, чи не скасовано запит
+CANCEL_POLL_SECONDS = 0.5
+
+_pool = None
+_pool_lock = threading.Lock()
+# Воркер gunicorn багатопотоковий (пул завантажень, задачі, каталог): fork копіював би чужі захоплені блокування,
+# тож процеси пулу стартують з чистого forkserver
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class PageTimeout(BaseException):
+    # Від BaseException, бо pdfplumber загортає будь-який Exception з pdfminer у PdfminerException
+    pass
+
+
+def _on_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _pdfplumber():
+    # pdfplumber з pdfminer імпортується з першим PDF, а не під час старту кожного воркера
+    import pdfplumber
+    return pdfplumber
+
+
+def page_has_table_hints(page):
+    # Без тексту чи ліній таблиці extract_table() все одно нічого не знайде
+    return bool(page.chars) and bool(page.edges)
+
+
+def extract_page_range(path, start, stop, page_timeout=PDF_PAGE_TIMEOUT, on_page=None):
+    use_alarm = page_timeout and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _on_page_timeout)
+    results = []
+    try:
+        with _pdfplumber().open(path) as pdf:
+            for page_no in range(start, min(stop, len(pdf.pages))):
+                page = pdf.pages[page_no]
+                try:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                    if page_has_table_hints(page):
+                        table = page.extract_table()
+                        if table:
+                            results.append((page_no, table))
+                except PageTimeout:
+                    logging.warning(f"PDF page {page_no + 1}: extraction exceeded {page_timeout}s, page skipped.")
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                    page.close()
+                if on_page:
+                    on_page(page_no + 1)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return results
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, PDF_WORKERS),
+                                        mp_context=multiprocessing.get_context(POOL_START_METHOD))
+        return _pool
+
+
+def shutdown_pool():
+    # Для коротких процесів (бенчмарки, скрипти): без цього процеси пулу не дають інтерпретатору завершитись
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def terminate_pool_processes(pool):
+    # shutdown() не зупиняє процес, що завис у C-коді, — без terminate() кожен такий таймаут лишав би живий процес.
+    # У ProcessPoolExecutor до Python 3.14 немає публічного способу, тож беремо його _processes
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        if process.is_alive():
+            process.terminate()
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            terminate_pool_processes(_pool)
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def wait_result(future, timeout=None, cancelled=None):
+    # cancelled — threading.Event запиту: очікування йде частинами, щоб скасований запит не чекав увесь ліміт
+    if cancelled is None:
+        return future.result(timeout=timeout)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        if cancelled.is_set():
+            future.cancel()
+            raise CancelledError()
+        step = CANCEL_POLL_SECONDS if deadline is None else max(0, min(CANCEL_POLL_SECONDS, deadline - time.monotonic()))
+        try:
+            return future.result(timeout=step)
+        except FuturesTimeoutError:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise
+
+
+def extract_pdf_rows(file, filename, workers=None, page_timeout=None, progress=None, cancelled=None):
+    workers = PDF_WORKERS if workers is None else workers
+    page_timeout = PDF_PAGE_TIMEOUT if page_timeout is None else page_timeout
+
+    file.seek(0)
+    # Воркерам пулу потрібен шлях до файлу, а не потік завантаження
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        while True:
+            chunk = file.read(1024 * 1024)
+            if not chunk:
+                break
+            tmp.write(chunk)
+        tmp_path = tmp.name
+
+    try:
+        with _pdfplumber().open(tmp_path) as pdf:
+            page_count = len(pdf.pages)
+        logging.info(f"{filename}: PDF has {page_count} pages.")
+        if progress:
+            progress(0, page_count, "pages")
+
+        # SIGALRM діє лише в головному потоці; з потоків завантажень і задач ліміт сторінки забезпечує процес пулу
+        can_limit_here = not page_timeout or threading.current_thread() is threading.main_thread()
+        if can_limit_here and (workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES):
+            def on_page(done):
+                if cancelled is not None and cancelled.is_set():
+                    raise CancelledError()
+                if progress:
+                    progress(done, page_count, "pages")
+            page_tables = extract_page_range(tmp_path, 0, page_count, page_timeout, on_page)
+        else:
+            workers = max(1, workers)
+            shard_size = max(1, math.ceil(page_count / (workers * 4)))
+            shards = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+            logging.info(f"{filename}: Extracting {len(shards)} page shards on {workers} processes.")
+            pool = _get_pool()
+            try:
+                futures = [pool.submit(extract_page_range, tmp_path, start, stop, page_timeout)
+                           for start, stop in shards]
+                page_tables = []
+                pages_done = 0
+                for future, (start, stop) in zip(futures, shards):
+                    # Запас поверх сигналу всередині воркера, якщо сторінка зависла в C-коді;
+                    # з PDF_PAGE_TIMEOUT=0 ліміту немає взагалі
+                    shard_timeout = page_timeout * (stop - start) + 30 if page_timeout else None
+                    try:
+                        page_tables.extend(wait_result(future, shard_timeout, cancelled))
+                    except CancelledError:
+                        # Запит уже відповів помилкою: решта шардів не потрібна, пул лишається іншим запитам
+                        for other in futures:
+                            other.cancel()
+                        raise
+                    except FuturesTimeoutError:
+                        raise TimeoutError(f"сторінки {start + 1}–{stop} не розібрано за {shard_timeout:g} с") from None
+                    pages_done += stop - start
+                    if progress:
+                        progress(pages_done, page_count, "pages")
+            except (BrokenProcessPool, TimeoutError):
+                _reset_pool()
+                raise
+
+        page_tables.sort(key=lambda item: item[0])
+        all_rows = []
+        for _, table in page_tables:
+            all_rows.extend(table)
+        return all_rows
+    finally:
+        os.remove(tmp_path)
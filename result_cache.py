@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from compact import MEMORY_SAMPLE_ROWS, frame_memory
+
+# Підвищувати при будь-якій зміні логіки читання/нормалізації, щоб старі записи не використовувались
+PIPELINE_VERSION = "3"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    def __init__(self, max_entries=32, disk_dir=None, max_bytes=None, max_disk_bytes=None, max_disk_age_hours=None):
+        # max_bytes — межа пам'яті фреймів у процесі (оцінка frame_memory); max_disk_bytes і max_disk_age_hours —
+        # межі Parquet-копій у disk_dir. None — без межі
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_disk_age_hours = max_disk_age_hours
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def make_key(self, file, ext="", variant=""):
+        # Розширення входить у ключ: ті самі байти під іншим ім'ям читаються іншим парсером.
+        # variant — налаштування, що змінюють результат без зміни коду (наприклад, COMPACT_DTYPES)
+        digest = hashlib.sha256(ext.lower().encode())
+        file.seek(0)
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+        file.seek(0)
+        return f"{digest.hexdigest()}-v{PIPELINE_VERSION}{variant}"
+
+    def derive_key(self, key, part):
+        # Ключ для частини файлу (наприклад, аркуша книги) без повторного хешування вмісту
+        digest = hashlib.sha256(f"{key}#{part}".encode()).hexdigest()
+        return f"{digest}-v{PIPELINE_VERSION}"
+
+    def content_id(self, key):
+        # Ключ без версії конвеєра: ті самі байти до і після підвищення PIPELINE_VERSION
+        return key.rsplit("-v", 1)[0]
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.parquet")
+
+    def get(self, key):
+        with self._lock:
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return df
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                df = pd.read_parquet(self._disk_path(key))
+                # mtime — час останнього використання: з диска першими видаляються давно не потрібні записи
+                os.utime(self._disk_path(key))
+            except Exception as e:
+                logging.warning(f"Result cache: could not read {self._disk_path(key)}: {e}")
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, df)
+                return df
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, df):
+        with self._lock:
+            self._remember(key, df)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                df.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+                self._prune_disk()
+            except Exception as e:
+                # Колонки зі змішаними типами pyarrow не серіалізує — лишаємо запис лише в пам'яті
+                logging.warning(f"Result cache: could not spill {key} to disk: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _remember(self, key, df):
+        # Оцінка за вибіркою рядків: точний deep-розмір object-колонок — прохід по кожному значенню
+        size = frame_memory(df, MEMORY_SAMPLE_ROWS)
+        self._forget(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # фрейм більший за всю межу лишається лише на диску
+        self._entries[key] = df
+        self._sizes[key] = size
+        self._total_bytes += size
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self.max_bytes is not None and self._total_bytes > self.max_bytes):
+            self._forget(next(iter(self._entries)))
+
+    def _forget(self, key):
+        if self._entries.pop(key, None) is not None:
+            self._total_bytes -= self._sizes.pop(key)
+
+    def _prune_disk(self):
+        if self.max_disk_bytes is None and self.max_disk_age_hours is None:
+            return
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".parquet") and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.max_disk_age_hours * 3600 if self.max_disk_age_hours is not None else None
+        for mtime, size, path in files:
+            too_old = cutoff is not None and mtime < cutoff
+            too_big = self.max_disk_bytes is not None and total > self.max_disk_bytes
+            if not too_old and not too_big:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # уже видалив інший воркер
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                "pipeline_version": PIPELINE_VERSION,
+            }
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from compact import wire_series
+
+# Рядок прайсу ідентифікують вино, виробник, рік і формат; решта колонок (ціна, залишок...) — вміст
+IDENTITY_COLUMNS = ["wine_name", "producer", "year", "bottle_size"]
+ROW_KEY_COLUMN = "_key"
+KEY_HASH_COLUMN = "_key_hash"
+CONTENT_HASH_COLUMN = "_content_hash"
+HASH_COLUMNS = [KEY_HASH_COLUMN, CONTENT_HASH_COLUMN]
+
+
+# Хеш відсутнього значення; порожній рядок хешується в 0, тож NaN має відрізнятися
+MISSING_HASH = np.uint64(0x9e3779b97f4a7c15)
+STRING_HASH_PRIME = np.uint64(0x100000001b3)
+DICTIONARY_SAMPLE_ROWS = 1000
+
+
+def mix64(z):
+    # Фіналізатор splitmix64: рівномірно розносить біти після поліноміального хешу
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_strings(array):
+    # Поліноміальний хеш по UTF-8 буферу Arrow-масиву цілком у numpy, без циклу по рядках:
+    # h = sum(byte_i * P^i) — різниця префіксних сум зважених байтів (переповнення uint64 — очікуване)
+    array = pc.cast(array, pa.large_string())
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data_buffer = array.buffers()[2]
+    data = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]] if data_buffer else np.zeros(0, np.uint8)
+    starts, lengths = offsets[:-1] - offsets[0], np.diff(offsets)
+    positions = np.arange(len(data), dtype=np.int64) - np.repeat(starts, lengths)
+    powers = np.cumprod(np.full(max(int(lengths.max(initial=0)), 1), STRING_HASH_PRIME, dtype=np.uint64))
+    prefix = np.concatenate([[np.uint64(0)], np.cumsum(data.astype(np.uint64) * powers[positions], dtype=np.uint64)])
+    return mix64((prefix[starts + lengths] - prefix[starts]) ^ lengths.astype(np.uint64))
+
+
+def hash_values(series, normalize=False):
+    # Колонки після compact_frame хешуються так само, як до стиснення, щоб збережені версії лишались порівнюваними:
+    # ціни float32 — як float64 до центів, рік і залишок (Int16...) — як текст з файлу, category — як рядки
+    series = wire_series(series)
+    if pd.api.types.is_numeric_dtype(series):
+        # int 12 і float 12.0 з різних версій файлу мають збігатися
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        hashes = mix64(values.view(np.uint64))
+        hashes[np.isnan(values)] = MISSING_HASH
+        return hashes
+
+    indices = None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        texts = pa.array(series.cat.categories.to_numpy(dtype=object), type=pa.string())
+        indices = pa.array(series.cat.codes.to_numpy())
+    else:
+        try:
+            texts = pa.array(series, type=pa.string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Змішані типи (числа й рядки з Excel) — порівнюємо текстове подання
+            texts = pa.array(series.astype(str).where(series.notna()), type=pa.string(), from_pandas=True)
+
+        # Колонки з повторами (виробник, регіон) хешуємо по словнику унікальних значень,
+        # майже унікальні (назва вина) — напряму: словник там лише додає роботи
+        sample = texts.slice(0, DICTIONARY_SAMPLE_ROWS)
+        if len(pc.unique(sample)) <= len(sample) // 2:
+            encoded = pc.dictionary_encode(texts)
+            texts, indices = encoded.dictionary, encoded.indices
+    if normalize:
+        texts = pc.utf8_lower(pc.utf8_trim_whitespace(texts))
+    hashes = hash_strings(texts)
+    if indices is not None:
+        return np.append(hashes, MISSING_HASH)[pc.fill_null(indices, -1).to_numpy()]
+    hashes[texts.is_null().to_numpy(zero_copy_only=False)] = MISSING_HASH
+    return hashes
+
+
+def combine_hashes(hashes, count):
+    combined = np.zeros(count, dtype=np.uint64)
+    for h in hashes:
+        # Порядок колонок важливий, переповнення uint64 — очікуване
+        combined = mix64(combined * np.uint64(1000003) ^ h)
+    return combined
+
+
+def row_hashes(df, columns=None):
+    # (ключ рядка, хеш вмісту): ключ — ідентичність + номер повтору, щоб дублікати не зливались
+    identity = [c for c in IDENTITY_COLUMNS if c in df.columns]
+    content = sorted(c for c in (columns if columns is not None else df.columns)
+                     if c not in identity and c not in (ROW_KEY_COLUMN, *HASH_COLUMNS))
+    identity_hash = combine_hashes([hash_values(df[c], normalize=True) for c in identity], len(df))
+    if pd.Index(identity_hash).is_unique:
+        occurrence = np.zeros(len(df), dtype=np.uint64)
+    else:
+        occurrence = pd.Series(identity_hash).groupby(identity_hash).cumcount().to_numpy(dtype=np.uint64)
+    keys = combine_hashes([identity_hash, occurrence], len(df))
+    content_hash = combine_hashes(
+        [hash_values(df[c]) if c in df.columns else np.full(len(df), MISSING_HASH) for c in content], len(df))
+    return keys, content_hash
+
+
+def diff_positions(old_keys, old_content, new_keys, new_content):
+    # Позиції доданих і змінених рядків нової версії та вилучених рядків старої
+    matched_at = pd.Index(old_keys).get_indexer(new_keys)
+    matched = matched_at >= 0
+    added = np.flatnonzero(~matched)
+    changed = np.flatnonzero(matched & (old_content[np.where(matched, matched_at, 0)] != new_content))
+    kept = np.zeros(len(old_keys), dtype=bool)
+    kept[matched_at[matched]] = True
+    return added, changed, np.flatnonzero(~kept)
+
+
+def format_keys(keys):
+    return [f"{k:016x}" for k in keys.tolist()]
+
+
+def frame_with_keys(df):
+    keys, _ = row_hashes(df)
+    return df.assign(**{ROW_KEY_COLUMN: format_keys(keys)})
+
+
+class SupplierVersions:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _slug(self, supplier):
+        # Ім'я файлу з назви постачальника: читабельна частина + хеш проти збігів після заміни символів
+        readable = re.sub(r"[^\w.-]+", "_", supplier).strip("_.")[:64]
+        return f"{readable}-{hashlib.sha256(supplier.encode()).hexdigest()[:12]}"
+
+    def _paths(self, supplier):
+        base = os.path.join(self.data_dir, self._slug(supplier))
+        return f"{base}.parquet", f"{base}.json"
+
+    def meta(self, supplier):
+        meta_path = self._paths(supplier)[1]
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def _write(self, path, write):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _dump_json(self, path, data):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+
+    def _save_frame(self, path, df):
+        try:
+            self._write(path, lambda tmp: df.to_parquet(tmp, index=False))
+        except Exception as e:
+            # Колонки зі змішаними типами pyarrow не серіалізує — зберігаємо їх як рядки
+            logging.info(f"Supplier versions: storing mixed-type columns as strings ({e})")
+            df = df.copy()
+            for col in df.select_dtypes(include=["object"]).columns:
+                df[col] = df[col].astype("string")
+            self._write(path, lambda tmp: df.to_parquet(tmp, index=False))
+
+    def update(self, supplier, filename, list_id, df):
+        # Повертає (дельта, мета, попередній list_id); дельта — фрейми added/changed/removed з колонкою _key
+        with self._lock:
+            previous = self.meta(supplier)
+            if previous is not None and previous["list_id"] == list_id:
+                empty = df.iloc[0:0].assign(**{ROW_KEY_COLUMN: pd.Series(dtype=str)})
+                return {"added": empty, "changed": empty, "removed": empty}, previous, list_id
+
+            data_path, meta_path = self._paths(supplier)
+            old = pd.read_parquet(data_path) if previous is not None and os.path.exists(data_path) else None
+            new_keys, new_content = row_hashes(df)
+            if old is None:
+                added, changed, removed = np.arange(len(df)), np.array([], dtype=int), np.array([], dtype=int)
+                old_keys = np.array([], dtype=np.uint64)
+            else:
+                old_columns = [c for c in old.columns if c not in HASH_COLUMNS]
+                old_keys, old_content = old[KEY_HASH_COLUMN].to_numpy(), old[CONTENT_HASH_COLUMN].to_numpy()
+                diff_keys, diff_content = new_keys, new_content
+                if set(old_columns) != set(df.columns):
+                    # Інший набір колонок: обидві версії хешуємо за їх об'єднанням, тож нова колонка — це зміна
+                    columns = list(dict.fromkeys(list(df.columns) + old_columns))
+                    old_keys, old_content = row_hashes(old[old_columns], columns)
+                    diff_keys, diff_content = row_hashes(df, columns)
+                added, changed, removed = diff_positions(old_keys, old_content, diff_keys, diff_content)
+
+            stored = df.reset_index(drop=True).assign(**{KEY_HASH_COLUMN: new_keys, CONTENT_HASH_COLUMN: new_content})
+            self._save_frame(data_path, stored)
+            meta = {
+                "supplier": supplier,
+                "filename": filename,
+                "list_id": list_id,
+                "version": (previous or {}).get("version", 0) + 1,
+                "rows": len(df),
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._write(meta_path, lambda tmp: self._dump_json(tmp, meta))
+
+        def rows_with_keys(frame, positions, keys):
+            return frame.iloc[positions][[c for c in frame.columns if c not in HASH_COLUMNS]].assign(
+                **{ROW_KEY_COLUMN: format_keys(keys[positions])})
+
+        delta = {
+            "added": rows_with_keys(df, added, new_keys),
+            "changed": rows_with_keys(df, changed, new_keys),
+            "removed": rows_with_keys(old, removed, old_keys) if old is not None else rows_with_keys(df, [], new_keys),
+        }
+        return delta, meta, (previous or {}).get("list_id")